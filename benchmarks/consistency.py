@@ -0,0 +1,182 @@
+"""
+Consistency check: drives the FastAPI app in-process against a local replica set and verifies, from
+the MongoDB commands each request issues, that the routing policies in main.py hold:
+
+- anonymous post reads go to a secondary (or to the primary when the set has none),
+- requests with the API key read from the primary,
+- an anonymous read right after an edit is pinned to the primary and sees the edit,
+- unsubscribes and SendGrid webhook writes are sent with the low-value write concern.
+
+MONGO_URI must point at a replica set, e.g. three local members started with --replSet rs0 and
+`rs.initiate()`; a single-member set works too but can only show primary reads. The check uses a
+throwaway database and drops it afterwards. Exits non-zero when a check fails.
+
+Usage: python benchmarks/consistency.py [--mongo mongodb://localhost:27017/?replicaSet=rs0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import List
+
+from pymongo import monitoring
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+API_KEY = "consistency-api-key"
+WEBHOOK_TOKEN = "consistency-webhook-token"
+DATABASE = "blog_consistency"
+
+
+class CommandLog(monitoring.CommandListener):
+    """
+    Every command sent while a check runs, with the server that received it.
+    """
+
+    def __init__(self):
+        self.commands: List[dict] = []
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.commands.append({
+            "command": event.command_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "server": event.connection_id,
+            "write_concern": event.command.get("writeConcern"),
+        })
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def on(self, collection: str, *commands: str) -> List[dict]:
+        return [command for command in self.commands if command["collection"] == collection and command["command"] in commands]
+
+
+command_log = CommandLog()
+
+
+def post_body(title: str) -> dict:
+    return {
+        "title": title,
+        "subtitle": None,
+        "summary": "Checks where reads and writes are routed.",
+        "author": "Consistency",
+        "author_link": None,
+        "publish_date": datetime(2024, 1, 1).isoformat(),
+        "body": "<p>Body</p>",
+        "mail_subject": "New post",
+        "mail_content": "<p>New post</p>",
+    }
+
+
+async def run() -> List[str]:
+    import httpx
+    import classes.Database as database
+
+    await database.get_client().drop_database(DATABASE)
+
+    import main
+    from classes.Consistency import recent_writes
+    from classes.NewsLetterSignup import NewsletterSignup
+    from classes.Post import Post
+    from classes.PostRendition import PostRendition
+    from classes.SendGridEvent import SendGridEvent
+
+    failures = []
+
+    def check(name: str, passed: bool, detail: str):
+        print(f"{'PASS' if passed else 'FAIL'}  {name}: {detail}")
+        if not passed:
+            failures.append(name)
+
+    try:
+        async with main.lifespan(main.app):
+            client = database.get_client()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://consistency") as http:
+                admin = {"api_key": API_KEY}
+                # Seeded straight into the collection, like the load benchmark; the first read renders it
+                seeded = await Post.get_motor_collection().insert_one({
+                    **post_body("Original title"),
+                    "publish_date": datetime(2024, 1, 1),
+                    "img_url": "https://example.com/image.jpg",
+                    "text_url": "consistency-post",
+                })
+                post_id = str(seeded.inserted_id)
+                await NewsletterSignup.get_motor_collection().insert_one({"name": "Reader", "location": "London", "email": "reader@consistency.example", "isActive": True})
+
+                # Let the secondaries catch up with the seed and forget this instance's writes
+                await asyncio.sleep(2)
+                recent_writes.clear()
+                primary, secondaries = client.primary, client.secondaries
+                # Beanie names each collection after its document class
+                posts, renditions = Post.get_motor_collection().name, PostRendition.get_motor_collection().name
+                newsletter, events = NewsletterSignup.get_motor_collection().name, SendGridEvent.get_motor_collection().name
+
+                command_log.commands.clear()
+                (await http.get("/posts/", params={"limit": 3})).raise_for_status()
+                servers = {command["server"] for command in command_log.on(posts, "find", "aggregate", "count")}
+                expected = secondaries if secondaries else {primary}
+                check("anonymous reads", bool(servers) and servers <= expected, f"served by {sorted(servers)}, secondaries {sorted(secondaries)}")
+
+                command_log.commands.clear()
+                (await http.get("/posts/", params={"limit": 4}, headers=admin)).raise_for_status()
+                servers = {command["server"] for command in command_log.on(posts, "find", "aggregate", "count")}
+                check("operator reads", servers == {primary}, f"served by {sorted(servers)}, primary {primary}")
+
+                (await http.put(f"/posts/{post_id}", json=post_body("Edited title"), headers=admin)).raise_for_status()
+                command_log.commands.clear()
+                response = await http.get(f"/posts/{post_id}")
+                response.raise_for_status()
+                servers = {command["server"] for command in command_log.on(renditions, "find") + command_log.on(posts, "find")}
+                title = response.json()["title"]
+                check("read after edit", servers == {primary} and title == "Edited title", f"served by {sorted(servers)}, title {title!r}")
+
+                command_log.commands.clear()
+                (await http.get("/newsletter/unsubscribe", params={"email": "reader@consistency.example"})).raise_for_status()
+                concerns = [command["write_concern"] for command in command_log.on(newsletter, "update")]
+                check("unsubscribe write concern", bool(concerns) and all(concern and concern.get("w") == 1 for concern in concerns), f"{concerns}")
+
+                command_log.commands.clear()
+                events = [{"event": "unsubscribe", "email": "reader@consistency.example", "sg_event_id": "consistency-1", "list": "newsletter"}]
+                (await http.post("/webhooks/sendgrid/events", params={"token": WEBHOOK_TOKEN}, json=events)).raise_for_status()
+                concerns = [command["write_concern"] for command in command_log.on(events, "insert")]
+                check("webhook write concern", bool(concerns) and all(concern and concern.get("w") == 1 for concern in concerns), f"{concerns}")
+    finally:
+        await database.get_client().drop_database(DATABASE)
+        database.close_client()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default=os.environ.get("MONGO_URI"), help="MongoDB URI of a replica set")
+    args = parser.parse_args()
+
+    if not args.mongo:
+        parser.error("set MONGO_URI or pass --mongo (a local replica set URI)")
+
+    # Everything the app reads from the environment has to be in place before it is imported
+    os.environ.update({
+        "API_KEY": API_KEY,
+        "MONGO_URI": args.mongo,
+        "MONGO_DATABASE": DATABASE,
+        "SENDGRID_WEBHOOK_TOKEN": WEBHOOK_TOKEN,
+        "MONGO_LOW_VALUE_WRITE_CONCERN": "1",
+    })
+    # Registered before the client is created, so it sees every command the app sends
+    monitoring.register(command_log)
+
+    failures = asyncio.run(run())
+    if failures:
+        print("Failed: " + ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
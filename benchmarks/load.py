@@ -0,0 +1,303 @@
+"""
+Load benchmark: drives every router of the FastAPI app in-process at a fixed concurrency and reports
+throughput and p50/p95/p99 latency per scenario.
+
+The app runs against MONGO_URI (a throwaway database, dropped afterwards) or, with --mongo memory,
+against mongomock-motor. SendGrid is replaced by a local fake server through SENDGRID_API_URL and
+Google Maps by the stub autocomplete provider, so no external service is ever called.
+
+Results are written as JSON; pass an earlier file as --baseline to print the difference and exit
+non-zero when a scenario got slower than --threshold.
+
+Usage: python benchmarks/load.py [--mongo memory] [--concurrency 16] [--requests 500]
+                                 [--posts 500] [--subscribers 2000] [--output load.json]
+                                 [--baseline load.json] [--threshold 0.1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+API_KEY = "benchmark-api-key"
+DATABASE = "blog_benchmark"
+
+
+class Scenario(NamedTuple):
+    name: str
+    # request number -> (method, path, json body)
+    request: Callable[[int], tuple]
+    # Share of --requests issued for this scenario, e.g. sends are far rarer than reads
+    weight: float = 1.0
+    # Uses server features mongomock lacks, such as $text, so only runs against a real mongod
+    mongod_only: bool = False
+
+
+class FakeSendGrid(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        FakeSendGrid.requests += 1
+        if FakeSendGrid.latency:
+            time.sleep(FakeSendGrid.latency)
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_sendgrid(latency: float) -> ThreadingHTTPServer:
+    FakeSendGrid.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSendGrid)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def scenarios(posts: List[dict], subscribers: int) -> List[Scenario]:
+    run = int(time.time())
+    return [
+        Scenario("posts_list", lambda i: ("GET", f"/posts/?page={i % 5 + 1}&limit=10", None)),
+        Scenario("posts_list_total", lambda i: ("GET", "/posts/?limit=10&include_total=true", None)),
+        Scenario("post_detail", lambda i: ("GET", f"/posts/{posts[i % len(posts)]['_id']}", None)),
+        Scenario("post_article", lambda i: ("GET", f"/posts/article/{posts[i % len(posts)]['text_url']}", None)),
+        Scenario("post_search", lambda i: ("GET", f"/posts/search?q={('lorem', 'benchmark post', 'summary', 'adipiscing elit')[i % 4]}&page={i % 3 + 1}", None), mongod_only=True),
+        Scenario("feed", lambda i: ("GET", "/feed.xml", None)),
+        Scenario("sitemap", lambda i: ("GET", "/sitemap.xml", None)),
+        Scenario("content_page", lambda i: ("GET", "/content/home", None)),
+        Scenario("geolocation", lambda i: ("GET", f"/geolocation/autocomplete?input={('lon', 'los', 'new', 'zur')[i % 4]}", None)),
+        Scenario("newsletter_signup", lambda i: ("POST", "/newsletter/signup", {"name": "Bench", "location": "London", "email": f"signup-{run}-{i}@bench.example"})),
+        Scenario("waitlist_signup", lambda i: ("POST", "/waitlist/signup", {"name": "Bench", "location": "London", "email": f"waitlist-{run}-{i}@bench.example"})),
+        Scenario("unsubscribe", lambda i: ("GET", f"/newsletter/unsubscribe?email=subscriber-{i % subscribers}@bench.example", None)),
+        Scenario("send_notification", lambda i: ("GET", f"/newsletter/send-notification/{posts[i % len(posts)]['_id']}", None), weight=0.02),
+    ]
+
+
+def summarize(durations: List[float], errors: int, elapsed: float) -> dict:
+    from classes.PoolTelemetry import percentile
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "throughput_rps": round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(1000 * percentile(durations, 0.50), 3),
+        "p95_ms": round(1000 * percentile(durations, 0.95), 3),
+        "p99_ms": round(1000 * percentile(durations, 0.99), 3),
+        "max_ms": round(1000 * max(durations, default=0.0), 3),
+    }
+
+
+async def drive(client, scenario: Scenario, total: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        method, path, body = scenario.request(-1 - i)
+        await client.request(method, path, json=body)
+
+    durations, errors = [], 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < total:
+            i = next_request
+            next_request += 1
+            method, path, body = scenario.request(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            durations.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(durations, errors, time.perf_counter() - started)
+
+
+async def seed(post_count: int, subscriber_count: int) -> List[dict]:
+    from classes.BlogContent import BlogContent
+    from classes.EmailTemplate import EmailTemplate
+    from classes.NewsLetterSignup import NewsletterSignup
+    from classes.Post import Post
+
+    published = datetime(2024, 1, 1)
+    posts = [{
+        "title": f"Benchmark post {n}",
+        "subtitle": "Subtitle",
+        "summary": "A short summary of the post. " * 4,
+        "author": "Bench",
+        "author_link": None,
+        "publish_date": published + timedelta(hours=n),
+        "body": "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>" * 60,
+        "mail_subject": "New post",
+        "mail_content": "<p>New post</p>",
+        "img_url": "https://example.com/image.jpg",
+        "text_url": f"benchmark-post-{n}",
+    } for n in range(post_count)]
+    await Post.get_motor_collection().insert_many(posts)
+
+    for start in range(0, subscriber_count, 1000):
+        await NewsletterSignup.get_motor_collection().insert_many([
+            {"name": f"Subscriber {n}", "location": "London", "email": f"subscriber-{n}@bench.example", "isActive": True}
+            for n in range(start, min(start + 1000, subscriber_count))
+        ])
+
+    await BlogContent.get_motor_collection().insert_many([
+        {"page_name": "home", "section_name": f"section-{n}", "content": "<p>Section content</p>" * 10} for n in range(12)
+    ])
+
+    templates = await EmailTemplate.get_motor_collection().insert_many([
+        {"subject": "[title]", "body": "<h1>[title]</h1><p>[summary]</p><a href='[link]'>Read</a><a href='[unsubscribe_link]'>Unsubscribe</a>",
+         "subject_placeholders": ["title"], "body_placeholders": ["title", "summary", "link", "unsubscribe_link"], "revision": 0},
+        {"subject": "Welcome", "body": "<p>Hi [name]</p><a href='[unsubscribe_link]'>Unsubscribe</a>",
+         "subject_placeholders": [], "body_placeholders": ["name", "unsubscribe_link"], "revision": 0},
+    ])
+    notification_id, welcome_id = (str(id) for id in templates.inserted_ids)
+    os.environ["NEWSLETTER_EMAIL_TEMPLATE_ID"] = notification_id
+    os.environ["NEWSLETTER_WELCOME_EMAIL_TEMPLATE_ID"] = welcome_id
+    os.environ["WAITLIST_WELCOME_EMAIL_TEMPLATE_ID"] = welcome_id
+
+    return await Post.get_motor_collection().find({}, {"_id": 1, "text_url": 1}).to_list(None)
+
+
+async def run(args) -> dict:
+    import httpx
+    import classes.Database as database
+
+    if args.mongo == "memory":
+        # Stand-in for a local mongod: numbers measure the app, not the database
+        from mongomock_motor import AsyncMongoMockClient
+        database._client = AsyncMongoMockClient()
+    else:
+        await database.get_client().drop_database(DATABASE)
+
+    import main
+    from classes.Autocomplete import StubProvider, set_autocomplete_provider
+    from classes.Background import _tasks
+
+    set_autocomplete_provider(StubProvider(latency=args.maps_latency))
+    results = {}
+    try:
+        async with main.lifespan(main.app):
+            posts = await seed(args.posts, args.subscribers)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"api_key": API_KEY}) as client:
+                for scenario in scenarios(posts, args.subscribers):
+                    if args.only and scenario.name not in args.only:
+                        continue
+                    if scenario.mongod_only and args.mongo == "memory":
+                        print(f"{scenario.name:<20} (skipped: needs a real mongod)")
+                        continue
+                    total = max(1, int(args.requests * scenario.weight))
+                    results[scenario.name] = await drive(client, scenario, total, args.concurrency, args.warmup)
+                    print(f"{scenario.name:<20} {results[scenario.name]}")
+            # Let welcome mails and send jobs finish against the fake SendGrid before tearing down
+            if _tasks:
+                await asyncio.wait(list(_tasks), timeout=args.drain_timeout)
+    finally:
+        if args.mongo != "memory":
+            await database.get_client().drop_database(DATABASE)
+        database.close_client()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            print(f"{name:<20} (no baseline)")
+            continue
+        changes = []
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if not previous[metric]:
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric]
+            # Lower throughput and higher latency are both regressions
+            worse = -change if metric == "throughput_rps" else change
+            changes.append(f"{metric} {previous[metric]} -> {current[metric]} ({change:+.1%})")
+            if worse > threshold:
+                regressions.append(f"{name} {metric} {change:+.1%}")
+        print(f"{name:<20} " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default=os.environ.get("MONGO_URI"), help="MongoDB URI, or 'memory' for mongomock-motor")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario, scaled by its weight")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--sendgrid-latency", type=float, default=0.05, help="seconds the fake SendGrid waits per call")
+    parser.add_argument("--maps-latency", type=float, default=0.1, help="seconds the stub Maps provider waits per call")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--only", nargs="*", help="run only these scenarios")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="JSON results of an earlier run to diff against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if not args.mongo:
+        parser.error("set MONGO_URI or pass --mongo (a local mongod URI, or 'memory')")
+
+    sendgrid = start_fake_sendgrid(args.sendgrid_latency)
+    # Everything the app reads from the environment has to be in place before it is imported
+    os.environ.update({
+        "API_KEY": API_KEY,
+        "MONGO_DATABASE": DATABASE,
+        "SENDGRID_API_URL": f"http://127.0.0.1:{sendgrid.server_port}",
+        "SENDGRID_API_KEY": "benchmark",
+        "GEOLOCATION_PROVIDER": "stub",
+        # Every benchmark request comes from one address; keep the per-IP limits out of the way
+        "SIGNUP_RATE_PER_MINUTE": "1000000",
+        "SIGNUP_BURST": "1000000",
+        "AUTOCOMPLETE_RATE_PER_SECOND": "1000000",
+        "AUTOCOMPLETE_BURST": "1000000",
+    })
+    if args.mongo != "memory":
+        os.environ["MONGO_URI"] = args.mongo
+    else:
+        # mongomock has no replica set to route to
+        os.environ.update({"MONGO_PUBLIC_READ_PREFERENCE": "primary", "MONGO_LOW_VALUE_WRITE_CONCERN": ""})
+
+    scenario_results = asyncio.run(run(args))
+    sendgrid.shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "mongo": "memory" if args.mongo == "memory" else "mongod",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "posts": args.posts,
+            "subscribers": args.subscribers,
+            "sendgrid_calls": FakeSendGrid.requests,
+        },
+        "scenarios": scenario_results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Serialization benchmark: the validate-then-dump path FastAPI takes for `response_model` routes
+against encoding projected Mongo documents directly with `dump_json`.
+
+Documents are generated in memory with the types Motor returns (ObjectId, naive datetime), so no
+database is needed. Both paths are checked to produce the same JSON before anything is timed,
+including for the Beanie Document models the content, template and subscriber routes return.
+Documents cannot be validated without a database, so their reference is the model built with
+`model_construct` and dumped the way `response_model` does.
+
+Usage: python benchmarks/serialization.py [--posts 1000] [--repeat 5] [--output serialization.json]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classes.BlogContent import BlogContent  # noqa: E402
+from classes.EmailTemplate import EmailTemplate  # noqa: E402
+from classes.HttpCache import dump_json, orjson, projection, serialize, wire_document  # noqa: E402
+from classes.NewsLetterSignup import NewsletterSignup  # noqa: E402
+from classes.WaitlistSingup import WaitlistSignup  # noqa: E402
+from routes.Post import PaginatedPostResponse, PostResponse, SinglePostResponse, render_post  # noqa: E402
+
+
+def make_posts(count: int) -> List[dict]:
+    published = datetime(2024, 1, 1, 12, 30, 15, 250000)
+    return [{
+        "_id": ObjectId(),
+        "title": f"Post {n}",
+        "subtitle": "A subtitle",
+        "summary": "A short summary of the post. " * 4,
+        "author": "Author",
+        "author_link": "https://example.com/author",
+        "publish_date": published + timedelta(hours=n),
+        "body": "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>" * 60,
+        "img_url": "https://example.com/image.jpg",
+        "text_url": f"post-{n}",
+    } for n in range(count)]
+
+
+def listing_page(posts: List[dict], limit: int) -> Dict[str, object]:
+    return {
+        "posts": [{key: post[key] for key in PostResponse.model_fields} for post in posts[:limit]],
+        "total_posts": len(posts),
+        "total_pages": -(-len(posts) // limit),
+        "current_page": 1,
+        "limit": limit,
+        "next_cursor": None,
+    }
+
+
+def cases(posts: List[dict]) -> dict:
+    single = {key: value for key, value in posts[0].items() if key != "_id"}
+    page = listing_page(posts, 10)
+    large_page = listing_page(posts, 100)
+    return {
+        # (validated path, direct path)
+        "post_detail": (lambda: serialize(SinglePostResponse, single), lambda: render_post(posts[0])),
+        "posts_page_10": (lambda: serialize(PaginatedPostResponse, page), lambda: dump_json(page)),
+        "posts_page_100": (lambda: serialize(PaginatedPostResponse, large_page), lambda: dump_json(large_page)),
+    }
+
+
+def document_cases() -> dict:
+    documents = {
+        BlogContent: [{"_id": ObjectId(), "page_name": "home", "section_name": f"section-{n}", "content": "<p>Section</p>"} for n in range(3)],
+        # Templates stored before revisions existed have no revision field
+        EmailTemplate: [{"_id": ObjectId(), "subject": "[title]", "body": "<p>[summary]</p>", "body_placeholders": ["summary"]}],
+        NewsletterSignup: [{"_id": ObjectId(), "name": "Reader", "location": "London", "email": "reader@example.com", "isActive": True}],
+        WaitlistSignup: [{"_id": ObjectId(), "name": "Reader", "location": "London", "email": "reader@example.com", "isActive": False}],
+    }
+
+    def reference(model, stored):
+        return TypeAdapter(List[model]).dump_json([model.model_construct(**document) for document in stored], by_alias=True)
+
+    def direct(model, stored):
+        fields = [key for key, included in projection(model).items() if included]
+        return dump_json([wire_document(model, {key: document[key] for key in fields if key in document}) for document in stored])
+
+    return {model.__name__: (lambda model=model, stored=stored: reference(model, stored), lambda model=model, stored=stored: direct(model, stored)) for model, stored in documents.items()}
+
+
+def time_call(call, repeat: int) -> float:
+    number, _ = timeit.Timer(call).autorange()
+    return min(timeit.Timer(call).repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {"encoder": "orjson" if orjson is not None else "pydantic_core", "cases": {}}
+    for name, (reference, direct) in document_cases().items():
+        if json.loads(reference()) != json.loads(direct()):
+            sys.exit(f"{name}: the two paths produce different JSON")
+
+    for name, (validated, direct) in cases(make_posts(args.posts)).items():
+        if json.loads(validated()) != json.loads(direct()):
+            sys.exit(f"{name}: the two paths produce different JSON")
+
+        before, after = time_call(validated, args.repeat), time_call(direct, args.repeat)
+        results["cases"][name] = {"validated_us": round(before * 1e6, 2), "direct_us": round(after * 1e6, 2), "speedup": round(before / after, 2)}
+        print(f"{name:<16} {results['cases'][name]}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
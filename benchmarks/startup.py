@@ -0,0 +1,129 @@
+"""
+Cold-start benchmark: import time per subsystem and time to first response per router.
+
+Each measurement runs in a fresh interpreter, like a new Functions worker. Routes that need Mongo
+are only exercised when MONGO_URI is set; the SendGrid and Maps clients are never called.
+
+Usage: python benchmarks/startup.py [--runs 5] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUBSYSTEMS = [
+    "classes.Database",
+    "classes.MailFanout",
+    "classes.GoogleMaps",
+    "classes.Autocomplete",
+    "classes.StaticAssets",
+    "routes.Post",
+    "routes.BlogContent",
+    "routes.Newsletter",
+    "routes.Waitlist",
+    "routes.EmailTemplate",
+    "routes.Geolocation",
+    "routes.Jobs",
+    "main",
+    "function_app",
+]
+
+# (name, path, needs Mongo)
+FIRST_REQUESTS = [
+    ("home", "/", False),
+    ("geolocation", "/geolocation/autocomplete?input=lon", False),
+    ("posts", "/posts/?limit=10", True),
+    ("content", "/content/", True),
+]
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+FIRST_RESPONSE_PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+
+import httpx
+
+async def run():
+    results = {{"import": imported}}
+    started = time.perf_counter()
+    async with main.lifespan(main.app):
+        results["startup"] = time.perf_counter() - started
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, path in {requests!r}:
+                started = time.perf_counter()
+                response = await client.get(path)
+                results[name] = {{"seconds": time.perf_counter() - started, "status": response.status_code}}
+    print(json.dumps(results))
+
+asyncio.run(run())
+"""
+
+
+def run_probe(source: str, env: dict) -> str:
+    completed = subprocess.run([sys.executable, "-c", source], cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "probe failed")
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    env = {**os.environ, "GEOLOCATION_PROVIDER": "stub", "PYTHONDONTWRITEBYTECODE": "1"}
+    with_mongo = bool(env.get("MONGO_URI"))
+
+    results = {"runs": args.runs, "imports": {}, "first_response": {}}
+    for module in SUBSYSTEMS:
+        try:
+            samples = [float(run_probe(IMPORT_PROBE.format(module=module), env)) for _ in range(args.runs)]
+            results["imports"][module] = {"median_ms": round(statistics.median(samples) * 1000, 2), "max_ms": round(max(samples) * 1000, 2)}
+        except RuntimeError as e:
+            results["imports"][module] = {"error": str(e)}
+        print(f"import {module:<24} {results['imports'][module]}")
+
+    requests = [(name, path) for name, path, needs_mongo in FIRST_REQUESTS if with_mongo or not needs_mongo]
+    if not with_mongo:
+        print("MONGO_URI not set: skipping lifespan startup and Mongo-backed routes")
+    samples = []
+    for _ in range(args.runs):
+        try:
+            source = FIRST_RESPONSE_PROBE.format(requests=requests)
+            if not with_mongo:
+                # Without a database, drive the app without its lifespan
+                source = source.replace("async with main.lifespan(main.app):", "if True:")
+            samples.append(json.loads(run_probe(source, env)))
+        except RuntimeError as e:
+            results["first_response"] = {"error": str(e)}
+            break
+    if samples:
+        for key in samples[0]:
+            values = [sample[key]["seconds"] if isinstance(sample[key], dict) else sample[key] for sample in samples]
+            entry = {"median_ms": round(statistics.median(values) * 1000, 2)}
+            if isinstance(samples[0][key], dict):
+                entry["status"] = samples[0][key]["status"]
+            results["first_response"][key] = entry
+            print(f"first response {key:<16} {entry}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
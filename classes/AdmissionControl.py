@@ -0,0 +1,178 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import suppress
+from typing import Deque, Mapping, Optional, Tuple
+
+from classes.HttpCache import dump_json
+from classes.Metrics import metrics
+
+
+class ConcurrencyLimit():
+    """
+    At most `limit` requests run at once and at most `queue` more wait for a slot, each for up to
+    `timeout` seconds. Anything beyond that is turned away immediately.
+    """
+
+    def __init__(self, limit: int, queue: int = 0, timeout: float = 5.0, retry_after: int = 5):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+            return True
+        except BaseException as e:
+            # A slot handed over just as we gave up still has to be passed on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            with suppress(ValueError):
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter, so newcomers cannot overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimit():
+    """
+    Token bucket per client: `burst` requests at once, refilled at `rate` requests per second.
+
+    A bucket left alone for `burst / rate` seconds is full again and indistinguishable from a new one,
+    so it is dropped. Buckets are kept in least-recently-used order, which lets the sweep stop at the
+    first one still refilling, and `max_clients` bounds memory under a flood of spoofed addresses.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.idle = burst / rate
+        # client -> (tokens, last update)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, client: str) -> float:
+        """
+        Take a token for `client`. Returns 0 when allowed, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        self._sweep(now)
+
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[client] = (tokens - 1, now)
+            return 0.0
+        self._buckets[client] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def _sweep(self, now: float):
+        while self._buckets:
+            client = next(iter(self._buckets))
+            _, updated = self._buckets[client]
+            if updated > now - self.idle and len(self._buckets) < self.max_clients:
+                break
+            del self._buckets[client]
+
+
+def client_address(scope) -> str:
+    # The Functions front end appends the caller to X-Forwarded-For; the last entry is the one it vouches for
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionControl():
+    """
+    ASGI middleware that sheds load before it reaches the routers.
+
+    `concurrency` and `rate_limits` map path prefixes to limits; the longest matching prefix applies.
+    Saturated concurrency limits answer 503 and exhausted rate limits 429, both with Retry-After.
+    """
+
+    def __init__(self, app, concurrency: Mapping[str, ConcurrencyLimit] = None, rate_limits: Mapping[str, RateLimit] = None):
+        self.app = app
+        self.concurrency = dict(concurrency or {})
+        self.rate_limits = dict(rate_limits or {})
+        metrics.collector(self.collect)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+
+        prefix = self._match(self.rate_limits, path)
+        if prefix is not None:
+            wait = self.rate_limits[prefix].hit(client_address(scope))
+            if wait:
+                metrics.inc("admission_rejections_total", {"limit": prefix, "reason": "rate_limited"})
+                return await self._reject(send, 429, "Too many requests", wait)
+
+        prefix = self._match(self.concurrency, path)
+        if prefix is None:
+            return await self.app(scope, receive, send)
+
+        limit = self.concurrency[prefix]
+        if not await limit.acquire():
+            metrics.inc("admission_rejections_total", {"limit": prefix, "reason": "overloaded"})
+            return await self._reject(send, 503, "Server busy, try again later", limit.retry_after)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    @staticmethod
+    def _match(limits: Mapping[str, object], path: str) -> Optional[str]:
+        matches = [prefix for prefix in limits if path.startswith(prefix)]
+        return max(matches, key=len) if matches else None
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float):
+        body = dump_json({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def collect(self):
+        for prefix, limit in self.concurrency.items():
+            yield "admission_active_requests", "Requests holding a concurrency slot", {"limit": prefix}, limit.active
+            yield "admission_queued_requests", "Requests waiting for a concurrency slot", {"limit": prefix}, limit.queued
+        for prefix, limit in self.rate_limits.items():
+            yield "admission_rate_limited_clients", "Clients with a partly drained token bucket", {"limit": prefix}, len(limit)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+
+from classes.GoogleMaps import Maps
+from classes.Metrics import metrics
+from classes.SingleFlight import SingleFlight
+from classes.TTLCache import TTLCache
+
+# Shortest cached prefix worth narrowing down from
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def matches(description: str, query: str) -> bool:
+    # Every query word has to start some word of the description, the way the provider matches
+    words = re.split(r"[\s,]+", description.lower())
+    return all(any(word.startswith(token) for word in words) for token in query.split())
+
+
+class AutocompleteProvider(ABC):
+    # Most predictions returned for one query; a shorter list is everything the provider knows for it
+    max_results = 5
+
+    @abstractmethod
+    async def autocomplete(self, input_text: str) -> List[str]:
+        ...
+
+
+class GoogleMapsProvider(AutocompleteProvider):
+    async def autocomplete(self, input_text: str) -> List[str]:
+        # The googlemaps client is synchronous, keep it off the event loop
+        with metrics.timer("outbound_request_duration_seconds", {"service": "google_maps"}):
+            return await asyncio.to_thread(Maps().autocomplete, input_text)
+
+
+class StubProvider(AutocompleteProvider):
+    """
+    Local stand-in for Google Places, for tests and benchmarks.
+    """
+
+    def __init__(self, places: Sequence[str] = None, latency: float = 0.0):
+        self.places = list(places or ["London, UK", "Los Angeles, CA, USA", "Lisbon, Portugal", "New Delhi, Delhi, India", "New York, NY, USA", "Zurich, Switzerland"])
+        self.latency = latency
+        self.calls = 0
+
+    async def autocomplete(self, input_text: str) -> List[str]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        query = normalize(input_text)
+        return [place for place in self.places if matches(place, query)][:self.max_results]
+
+
+class AutocompleteService():
+    """
+    Caches predictions by normalized input, answers longer inputs from a cached shorter prefix when
+    that prefix's result list was complete, and shares one provider call between identical in-flight queries.
+    """
+
+    def __init__(self, provider: AutocompleteProvider, cache: TTLCache):
+        self.provider = provider
+        self.cache = cache
+        self.provider_calls = 0
+        self.prefix_hits = 0
+        self._calls = SingleFlight()
+
+    async def autocomplete(self, input_text: str) -> List[str]:
+        query = normalize(input_text)
+        if not query:
+            return []
+
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached
+
+        narrowed = self._from_shorter_prefix(query)
+        if narrowed:
+            self.prefix_hits += 1
+            self.cache.set(query, narrowed)
+            return narrowed
+
+        async def call() -> List[str]:
+            self.provider_calls += 1
+            predictions = await self.provider.autocomplete(query)
+            self.cache.set(query, predictions)
+            return predictions
+
+        return await self._calls.do(query, call)
+
+    @property
+    def coalesced(self) -> int:
+        return self._calls.coalesced
+
+    def _from_shorter_prefix(self, query: str) -> Optional[List[str]]:
+        for length in range(len(query) - 1, MIN_PREFIX_LENGTH - 1, -1):
+            predictions = self.cache.peek(query[:length])
+            if predictions is None:
+                continue
+            if len(predictions) >= self.provider.max_results:
+                # Truncated list: longer inputs may match places that were cut off
+                return None
+            return [prediction for prediction in predictions if matches(prediction, query)]
+        return None
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "provider_calls": self.provider_calls, "prefix_hits": self.prefix_hits, "coalesced": self.coalesced}
+
+
+_service: Optional[AutocompleteService] = None
+
+
+def get_autocomplete_service() -> AutocompleteService:
+    if _service is None:
+        provider = StubProvider() if os.environ.get("GEOLOCATION_PROVIDER") == "stub" else GoogleMapsProvider()
+        return set_autocomplete_provider(provider)
+    return _service
+
+
+def set_autocomplete_provider(provider: AutocompleteProvider) -> AutocompleteService:
+    global _service
+    _service = AutocompleteService(provider, TTLCache(
+        maxsize=int(os.environ.get("GEOLOCATION_CACHE_SIZE", 4096)),
+        ttl=float(os.environ.get("GEOLOCATION_CACHE_TTL", 24 * 60 * 60)),
+    ))
+    return _service
@@ -0,0 +1,23 @@
+import asyncio
+import logging
+from typing import Coroutine
+
+# Strong references to detached tasks so they are not garbage collected before they finish
+_tasks = set()
+
+
+def spawn(coroutine: Coroutine, name: str = None) -> asyncio.Task:
+    """
+    Run a coroutine detached from the current request. Unlike Starlette background tasks this does
+    not hold up the ASGI call, which the Functions host waits on before replying.
+    """
+    task = asyncio.create_task(coroutine, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error(f"Background task {task.get_name()} failed: {task.exception()}")
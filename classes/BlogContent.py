@@ -1,5 +1,6 @@
 from beanie import Document
 from bson import ObjectId
+from pymongo import IndexModel, ASCENDING
 
 
 class BlogContent(Document):
@@ -9,6 +10,9 @@ class BlogContent(Document):
 
     class Settings:
         collection = "blog_contents"
+        indexes = [
+            IndexModel([("page_name", ASCENDING), ("section_name", ASCENDING)], unique=True, name="page_section_unique"),
+        ]
 
     class Config():
         json_encoders={
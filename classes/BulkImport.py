@@ -0,0 +1,212 @@
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from classes.Consistency import collection_for
+from classes.SubscriberList import normalize_email
+
+CHUNK_SIZE = 500
+# Enough to fix a broken upload; a file where everything fails does not need 100k identical lines
+MAX_REPORTED_ERRORS = 1000
+DUPLICATE_KEY = 11000
+
+Row = Tuple[int, dict]
+
+
+@dataclass
+class ImportReport:
+    received: int = 0
+    inserted: int = 0
+    # Rows whose unique key was already taken in the database, left untouched
+    existing: int = 0
+    failed: int = 0
+    errors: List[dict] = field(default_factory=list)
+    welcome_sent: Optional[int] = None
+    welcome_failed: Optional[int] = None
+    welcome_unknown: Optional[int] = None
+
+    def error(self, row: int, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        report = {
+            "received": self.received,
+            "inserted": self.inserted,
+            "existing": self.existing,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+        if self.welcome_sent is not None:
+            report["welcome"] = {"sent": self.welcome_sent, "failed": self.welcome_failed, "unknown": self.welcome_unknown}
+        return report
+
+
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def read_rows(stream: AsyncIterator[bytes], format: str) -> AsyncIterator[Row]:
+    """
+    Parse an NDJSON or CSV upload as it arrives, yielding (row number, fields). Rows that cannot be parsed
+    come back as (row number, None). CSV needs a header line; empty cells read as null.
+    """
+    number = 0
+    if format == "ndjson":
+        async for line in _lines(stream):
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+        return
+
+    header, record = None, ""
+    async for line in _lines(stream):
+        # A quoted cell may span lines; a record is complete once its quotes are balanced
+        record += line
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            values = next(csv.reader([record]))
+            if header is None:
+                header = [name.strip() for name in values]
+            else:
+                number += 1
+                yield number, dict(zip(header, (value if value != "" else None for value in values))) if len(values) == len(header) else None
+        record = ""
+    if record.strip():
+        yield number + 1, None
+
+
+async def chunked(rows: AsyncIterator[Row], size: int = CHUNK_SIZE) -> AsyncIterator[List[Row]]:
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate(model: Type[BaseModel], chunk: List[Row], key: str, seen: set, report: ImportReport) -> List[Tuple[int, dict]]:
+    """
+    Validate a chunk against `model`, dropping rows whose `key` already appeared earlier in the upload.
+    """
+    valid = []
+    for number, row in chunk:
+        report.received += 1
+        if row is None:
+            report.error(number, "Could not parse row")
+            continue
+        try:
+            document = model.model_validate(row).model_dump()
+        except ValidationError as e:
+            report.error(number, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()])
+            continue
+        unique = str(document[key]).lower()
+        if unique in seen:
+            report.error(number, f"Duplicate {key} in upload")
+            continue
+        seen.add(unique)
+        valid.append((number, document))
+    return valid
+
+
+async def insert_documents(collection, model: Type[BaseModel], rows: AsyncIterator[Row], key: str, report: ImportReport) -> List[dict]:
+    """
+    Validate and insert rows in chunks with unordered insert_many. Rows that hit the unique index on `key`
+    are reported as errors. Returns the inserted documents.
+    """
+    inserted, seen = [], set()
+    async for chunk in chunked(rows):
+        valid = validate(model, chunk, key, seen, report)
+        if not valid:
+            continue
+        documents = [document for _, document in valid]
+        failed: Dict[int, str] = {}
+        try:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                failed[error["index"]] = f"{key} already exists" if error["code"] == DUPLICATE_KEY else error["errmsg"]
+
+        for index, (number, document) in enumerate(valid):
+            if index in failed:
+                report.error(number, failed[index])
+            else:
+                inserted.append(document)
+        report.inserted = len(inserted)
+    return inserted
+
+
+async def upsert_subscribers(collection, model: Type[BaseModel], rows: AsyncIterator[Row], report: ImportReport) -> List[dict]:
+    """
+    Add subscribers in chunks with one unordered bulk_write of $setOnInsert upserts keyed by email.
+    Existing subscribers, including ones who unsubscribed, are left as they are. Returns the new ones.
+    """
+    inserted, seen = [], set()
+    async for chunk in chunked(rows):
+        valid = validate(model, chunk, "email", seen, report)
+        if not valid:
+            continue
+        operations = [
+            # The email comes from the query; everything else is only written for new subscribers
+            UpdateOne({"email": normalize_email(document["email"])}, {"$setOnInsert": {**{name: value for name, value in document.items() if name != "email"}, "isActive": True}}, upsert=True)
+            for _, document in valid
+        ]
+        failed: Dict[int, str] = {}
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+            for error in e.details["writeErrors"]:
+                # A concurrent signup inserted the same email first
+                if error["code"] != DUPLICATE_KEY:
+                    failed[error["index"]] = error["errmsg"]
+
+        for index, (number, document) in enumerate(valid):
+            if index in failed:
+                report.error(number, failed[index])
+            elif index in upserted:
+                inserted.append({**document, "email": normalize_email(document["email"]), "_id": upserted[index]})
+            else:
+                report.existing += 1
+        report.inserted = len(inserted)
+    return inserted
+
+
+async def import_subscribers(subscriber_list, model: Type[BaseModel], stream: AsyncIterator[bytes], format: str, welcome: bool = False) -> dict:
+    report = ImportReport()
+    if not subscriber_list.emails_normalized:
+        # Upserts match the lowercase address only, so fold mixed-case records first rather than duplicate them
+        await subscriber_list.normalize_stored_emails()
+    inserted = await upsert_subscribers(collection_for(subscriber_list.model), model, read_rows(stream, format), report)
+    if welcome and inserted:
+        result = await subscriber_list.send_welcome_many(inserted)
+        report.welcome_sent = result.sent if result else 0
+        report.welcome_failed = result.failed if result else len(inserted)
+        report.welcome_unknown = result.unknown if result else 0
+    return report.as_dict()
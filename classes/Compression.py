@@ -0,0 +1,156 @@
+import gzip
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from classes.TTLCache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encodings this instance can produce, best first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/xml", "application/rss+xml", "text/")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def preferred_encoding(header: str, available: Sequence[str] = ENCODINGS) -> str:
+    """
+    The Content-Encoding to answer with: the highest-quality accepted coding in `available`, ties going
+    to the earlier one, or "identity".
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_quality = "identity", 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, level: int = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if level is None else level)
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so its ETag, identical across instances
+        return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+    return body
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """
+    Every representation of `body` this instance can serve, at maximum compression, for content
+    that is compressed once and served many times.
+    """
+    variants = {"identity": body}
+    for encoding in ENCODINGS:
+        variants[encoding] = compress(body, encoding)
+    return variants
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    # Each encoded representation needs its own strong validator
+    return etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"'
+
+
+class CompressionMiddleware():
+    """
+    Compresses complete (non-streaming) text and JSON responses the client accepts an encoding for.
+
+    Responses that already carry a Content-Encoding, such as precompressed posts and static assets,
+    pass through untouched, as do streamed exports. Bodies with an ETag are compressed once per
+    (ETag, encoding) and then served from a small cache. A 304 answering a client that holds a
+    compressed copy gets the same encoded ETag and Vary header as the full response would.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5, cache_size: int = 512):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self._cache = TTLCache(maxsize=cache_size, ttl=3600)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        encoding = preferred_encoding(request_headers.get("accept-encoding"))
+        if encoding == "identity":
+            return await self.app(scope, receive, send)
+
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                return await send(message)
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if self._compressible(start, headers, message, body):
+                body = self._compress(body, encoding, headers.get("etag"))
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers:
+                    headers["ETag"] = variant_etag(headers["etag"], encoding)
+                message = {**message, "body": body}
+            elif start["status"] == 304:
+                self._revalidated(headers, request_headers.get("if-none-match", ""), encoding)
+            passthrough = True
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start: dict, headers: MutableHeaders, message: dict, body: bytes) -> bool:
+        return (
+            start["status"] == 200
+            and not message.get("more_body", False)
+            and "content-encoding" not in headers
+            and len(body) >= self.minimum_size
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
+
+    @staticmethod
+    def _revalidated(headers: MutableHeaders, if_none_match: str, encoding: str):
+        etag = headers.get("etag")
+        if etag is None or "content-encoding" in headers:
+            return
+        # The identity tag matched one the client holds; only an encoded one means the body was compressed
+        held = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if held & {variant_etag(etag, coding) for coding in ENCODINGS}:
+            headers["ETag"] = variant_etag(etag, encoding)
+            headers.add_vary_header("Accept-Encoding")
+
+    def _compress(self, body: bytes, encoding: str, etag: Optional[str]) -> bytes:
+        if etag is None:
+            return compress(body, encoding, self.levels[encoding])
+        key = f"{etag}:{encoding}"
+        compressed = self._cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding, self.levels[encoding])
+            self._cache.set(key, compressed)
+        return compressed
@@ -0,0 +1,166 @@
+import hmac
+import time
+from contextvars import ContextVar
+from typing import Dict, Mapping, Optional, Tuple
+
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+from classes.APIKey import API_KEY, API_KEY_NAME
+from classes.Metrics import metrics
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {mode!r}, expected one of {', '.join(READ_PREFERENCES)}")
+    return Primary() if mode == "primary" else READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+def write_concern(w: Optional[str]) -> Optional[WriteConcern]:
+    # Unset or empty keeps the client's write concern (majority on replica sets since MongoDB 5.0)
+    if not w:
+        return None
+    return WriteConcern(w=int(w) if w.isdigit() else w)
+
+
+class RecentWrites(monitoring.CommandListener):
+    """
+    When this instance last wrote to each collection, so reads that could land on a lagging secondary
+    can be sent to the primary for a while instead. Sees Beanie's writes as well as raw Motor ones.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, str] = {}
+        self._written: Dict[str, float] = {}
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            self._pending[event.request_id] = event.command[event.command_name]
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        # A failed write may still have been applied on the primary
+        self._record(event)
+
+    def _record(self, event):
+        collection = self._pending.pop(event.request_id, None)
+        if collection is not None:
+            self._written[collection] = time.monotonic()
+
+    def within(self, collection: str, seconds: float) -> bool:
+        written = self._written.get(collection)
+        return written is not None and time.monotonic() - written < seconds
+
+    def clear(self):
+        self._written.clear()
+
+
+recent_writes = RecentWrites()
+
+
+class ConsistencyPolicy():
+    """
+    Where one class of operations reads from and how its writes are acknowledged. None keeps the
+    client's setting.
+
+    With `pin_after_write`, a collection this instance wrote to in the last `pin_after_write` seconds
+    is read from the primary, so a cache refilled right after an edit never stores what a lagging
+    secondary still has.
+    """
+
+    def __init__(self, read_preference=None, write_concern: Optional[WriteConcern] = None, pin_after_write: float = 0.0):
+        self.read_preference = read_preference
+        self.write_concern = write_concern
+        self.pin_after_write = pin_after_write
+        # (collection full name, pinned) -> (collection it was derived from, derived collection)
+        self._collections: Dict[Tuple[str, bool], tuple] = {}
+
+    def apply(self, collection, pinned: bool = False):
+        key = (collection.full_name, pinned)
+        cached = self._collections.get(key)
+        # A reconnected client hands out new collection objects
+        if cached is None or cached[0] is not collection:
+            cached = self._collections[key] = (collection, self._derive(collection, pinned))
+        return cached[1]
+
+    def _derive(self, collection, pinned: bool):
+        options = {}
+        preference = Primary() if pinned else self.read_preference
+        if preference is not None and preference != collection.read_preference:
+            options["read_preference"] = preference
+        if self.write_concern is not None and self.write_concern != collection.write_concern:
+            options["write_concern"] = self.write_concern
+        return collection.with_options(**options) if options else collection
+
+
+# Policy of the request being served; None, as in background jobs started at boot, uses the client's settings
+current_policy: ContextVar[Optional[ConsistencyPolicy]] = ContextVar("current_policy", default=None)
+
+
+def collection_for(model):
+    """
+    The model's Motor collection with the read preference and write concern of the current request.
+    """
+    collection = model.get_motor_collection()
+    policy = current_policy.get()
+    if policy is None:
+        return collection
+    if policy.pin_after_write and recent_writes.within(collection.name, policy.pin_after_write):
+        metrics.inc("mongo_primary_pinned_total", {"collection": collection.name})
+        return policy.apply(collection, pinned=True)
+    return policy.apply(collection)
+
+
+class ConsistencyRouting():
+    """
+    ASGI middleware that picks the ConsistencyPolicy each request runs under.
+
+    Requests carrying the valid API key are operator traffic and use `admin`, so editors read their
+    own writes whichever instance served them. Everything else uses the policy of the longest
+    matching path prefix in `routes`, or `default`.
+    """
+
+    def __init__(self, app, routes: Mapping[str, ConsistencyPolicy] = None, admin: ConsistencyPolicy = None, default: ConsistencyPolicy = None):
+        self.app = app
+        self.routes = dict(routes or {})
+        self.admin = admin
+        self.default = default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = current_policy.set(self._policy(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_policy.reset(token)
+
+    def _policy(self, scope) -> Optional[ConsistencyPolicy]:
+        if self.admin is not None and self._operator(scope):
+            return self.admin
+        path = scope["path"]
+        matches = [prefix for prefix in self.routes if path.startswith(prefix)]
+        return self.routes[max(matches, key=len)] if matches else self.default
+
+    @staticmethod
+    def _operator(scope) -> bool:
+        # Checked, not just present: a made-up key must not buy an anonymous caller primary reads
+        name = API_KEY_NAME.encode("latin-1")
+        for header, value in scope.get("headers", ()):
+            if header == name:
+                return bool(API_KEY) and hmac.compare_digest(value, API_KEY.encode())
+        return False
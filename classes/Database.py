@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+from typing import List, Optional
+
+import motor.motor_asyncio
+from beanie import init_beanie
+
+from classes.BlogContent import BlogContent
+from classes.Consistency import recent_writes
+from classes.EmailTemplate import EmailTemplate
+from classes.Metrics import command_metrics
+from classes.NewsLetterSignup import NewsletterSignup
+from classes.PoolTelemetry import pool_telemetry
+from classes.Post import Post
+from classes.PostRendition import PostRendition
+from classes.SendJob import SendJob, SendLog
+from classes.SendGridEvent import SendGridEvent
+from classes.WaitlistSingup import WaitlistSignup
+
+DOCUMENT_MODELS = [NewsletterSignup, Post, BlogContent, EmailTemplate, WaitlistSignup, SendJob, SendLog, SendGridEvent, PostRendition]
+
+# Environment variable -> MongoClient option; unset variables keep the driver defaults
+CLIENT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", int),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    # Comma separated, e.g. "zstd,snappy,zlib"
+    "MONGO_COMPRESSORS": ("compressors", str),
+}
+
+# Kept on the module so that every invocation served by the same worker reuses them
+_client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+_database = None
+_ready: Optional[asyncio.Task] = None
+
+
+def client_options() -> dict:
+    options = {}
+    for variable, (option, cast) in CLIENT_OPTIONS.items():
+        value = os.environ.get(variable)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = motor.motor_asyncio.AsyncIOMotorClient(os.environ.get("MONGO_URI"), event_listeners=[pool_telemetry, command_metrics, recent_writes], **client_options())
+    return _client
+
+
+async def warm_up(connections: int = None) -> dict:
+    """
+    Open up to `connections` pooled connections in parallel and touch every model collection,
+    so the first burst of real traffic does not pay for connection setup.
+    """
+    database = get_database()
+    connections = connections or int(os.environ.get("MONGO_MIN_POOL_SIZE") or 10)
+    started = time.perf_counter()
+
+    # Concurrent commands each check out their own connection
+    await asyncio.gather(*(database.command("ping") for _ in range(connections)))
+    await asyncio.gather(*(model.get_motor_collection().find_one({}, {"_id": 1}) for model in DOCUMENT_MODELS))
+
+    return {"connections": connections, "collections": len(DOCUMENT_MODELS), "elapsed_ms": round(1000 * (time.perf_counter() - started), 2)}
+
+
+def get_database():
+    global _database
+    if _database is None:
+        _database = get_client().get_database(name=os.environ.get("MONGO_DATABASE", "blog"))
+    return _database
+
+
+async def init_database(document_models: List[type] = DOCUMENT_MODELS) -> bool:
+    """
+    Initialize Beanie once per worker. Returns True only for the call that did the work.
+    """
+    global _ready
+    if _ready is None:
+        # Indexes are reconciled separately so cold start does not wait on index builds
+        _ready = asyncio.ensure_future(init_beanie(get_database(), document_models=document_models, skip_indexes=True))
+        try:
+            await _ready
+        except BaseException:
+            # Let the next call retry instead of replaying the failure
+            _ready = None
+            raise
+        return True
+
+    await _ready
+    return False
+
+
+def database_ready() -> bool:
+    return _ready is not None and _ready.done() and not _ready.cancelled() and _ready.exception() is None
+
+
+def close_client():
+    global _client, _database, _ready
+    if _client is not None:
+        _client.close()
+    _client = _database = _ready = None
@@ -1,5 +1,13 @@
 from beanie import Document
-from typing import List
+from typing import List, Optional
+import os
+from classes.TemplateRenderer import CompiledTemplate, compile_template, placeholder_errors
+from classes.TTLCache import TTLCache
+
+_cache = TTLCache(
+    maxsize=int(os.environ.get("EMAIL_TEMPLATE_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("EMAIL_TEMPLATE_CACHE_TTL", 300)),
+)
 
 # Models for MongoDB
 class EmailTemplate(Document):
@@ -7,6 +15,32 @@ class EmailTemplate(Document):
     body: str
     subject_placeholders: List[str] = []
     body_placeholders: List[str] = []
+    # Bumped on every update so compiled copies of older versions are never reused
+    revision: int = 0
 
     class Settings:
-        collection = "emailTemplates"
\ No newline at end of file
+        collection = "emailTemplates"
+
+    @classmethod
+    async def get_cached(cls, id: str) -> Optional["EmailTemplate"]:
+        # Cached documents are shared between requests and must not be mutated; edit a fresh copy from get()
+        template = _cache.get(str(id))
+        if template is None:
+            template = await cls.get(id)
+            if template is not None:
+                _cache.set(str(id), template)
+        return template
+
+    @staticmethod
+    def invalidate(id: str):
+        _cache.pop(str(id))
+
+    @staticmethod
+    def cache_stats() -> dict:
+        return _cache.stats()
+
+    def compiled(self) -> CompiledTemplate:
+        return compile_template(self)
+
+    def validate_placeholders(self) -> List[str]:
+        return placeholder_errors(self.subject, self.subject_placeholders, "subject") + placeholder_errors(self.body, self.body_placeholders, "body")
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from classes.HttpCache import make_etag
+from classes.Post import Post
+from classes.Consistency import collection_for
+
+SITE_URL = os.environ.get("SITE_URL", "https://journey.thehightabl.com")
+API_URL = os.environ.get("API_URL", "https://journey-api.thehightabl.com")
+FEED_TITLE = os.environ.get("FEED_TITLE", "Journey")
+FEED_DESCRIPTION = os.environ.get("FEED_DESCRIPTION", "Latest posts")
+# Sitemaps are capped at 50,000 URLs per file
+SITEMAP_MAX_URLS = 50_000
+
+
+def article_url(text_url: str) -> str:
+    return f"{SITE_URL}/posts/article/{quote(text_url)}"
+
+
+def _utc(value: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes; request bodies may carry an offset
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class FeedEntry():
+    __slots__ = ("sort_key", "publish_date", "item", "url")
+
+    def __init__(self, post: dict):
+        publish_date = _utc(post["publish_date"])
+        link = escape(article_url(post["text_url"]))
+        self.sort_key = (publish_date, str(post["_id"]))
+        self.publish_date = publish_date
+        # Each post's XML is rendered once, when it is loaded or written
+        self.item = (
+            f"<item><title>{escape(post['title'])}</title><link>{link}</link>"
+            f"<guid isPermaLink=\"true\">{link}</guid><pubDate>{format_datetime(publish_date, usegmt=True)}</pubDate>"
+            f"<description>{escape(post.get('summary') or '')}</description></item>"
+        )
+        self.url = f"<url><loc>{link}</loc><lastmod>{publish_date.date().isoformat()}</lastmod></url>"
+
+
+class PostFeeds():
+    """
+    RSS feed and sitemap of the posts, kept as ready-to-send bytes.
+
+    Entries are loaded from Mongo once and then patched by the post write handlers, which only drop
+    the rendered documents; the next request re-joins the per-post fragments. A full reload every `ttl`
+    seconds picks up writes made through other instances.
+    """
+
+    def __init__(self, ttl: float = 900.0, feed_size: int = 50):
+        self.ttl = ttl
+        self.feed_size = feed_size
+        self._entries: Optional[Dict[str, FeedEntry]] = None
+        self._loaded_at = 0.0
+        self._rendered: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = asyncio.Lock()
+        # Bumped by every write, so a load that raced one is redone on the next request
+        self._generation = 0
+
+    async def feed(self) -> Tuple[bytes, str]:
+        return await self._get("feed", self._render_feed)
+
+    async def sitemap(self) -> Tuple[bytes, str]:
+        return await self._get("sitemap", self._render_sitemap)
+
+    def upsert(self, post: dict):
+        self._generation += 1
+        if self._entries is not None:
+            self._entries[str(post["_id"])] = FeedEntry(post)
+            self._rendered.clear()
+
+    def remove(self, post_id):
+        self._generation += 1
+        if self._entries is not None and self._entries.pop(str(post_id), None) is not None:
+            self._rendered.clear()
+
+    async def _get(self, name: str, render) -> Tuple[bytes, str]:
+        if self._entries is None or time.monotonic() - self._loaded_at > self.ttl:
+            await self._load()
+        rendered = self._rendered.get(name)
+        if rendered is None:
+            body = render(sorted(self._entries.values(), key=lambda entry: entry.sort_key, reverse=True))
+            rendered = self._rendered[name] = (body, make_etag(body))
+        return rendered
+
+    async def _load(self):
+        async with self._lock:
+            # Another request may have reloaded while this one waited
+            if self._entries is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+            generation = self._generation
+            posts = await collection_for(Post).find({}, {"text_url": 1, "title": 1, "summary": 1, "publish_date": 1}).to_list(None)
+            self._entries = {str(post["_id"]): FeedEntry(post) for post in posts}
+            self._loaded_at = time.monotonic() if generation == self._generation else 0.0
+            self._rendered.clear()
+
+    def _render_feed(self, entries) -> bytes:
+        entries = entries[:self.feed_size]
+        # Derived from the content rather than the clock, so every instance renders identical bytes
+        last_build = f"<lastBuildDate>{format_datetime(entries[0].publish_date, usegmt=True)}</lastBuildDate>" if entries else ""
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+            f"<title>{escape(FEED_TITLE)}</title><link>{escape(SITE_URL)}</link><description>{escape(FEED_DESCRIPTION)}</description>"
+            f'<atom:link href="{escape(API_URL)}/feed.xml" rel="self" type="application/rss+xml"/>{last_build}'
+            + "".join(entry.item for entry in entries)
+            + "</channel></rss>\n"
+        ).encode()
+
+    def _render_sitemap(self, entries) -> bytes:
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + "".join(entry.url for entry in entries[:SITEMAP_MAX_URLS])
+            + "</urlset>\n"
+        ).encode()
+
+
+post_feeds = PostFeeds(ttl=float(os.environ.get("FEED_REBUILD_TTL", 900)), feed_size=int(os.environ.get("FEED_SIZE", 50)))
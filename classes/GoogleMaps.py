@@ -1,4 +1,3 @@
-import googlemaps
 import os
 
 
@@ -8,6 +7,8 @@ class Maps:
 
     def __new__(cls):
         if not cls.__client:
+            # Imported on first use so cold starts that never autocomplete skip the googlemaps package
+            import googlemaps
             cls.__client = googlemaps.Client(cls.__api_key)
         instance = super().__new__(cls)
         return instance
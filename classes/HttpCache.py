@@ -0,0 +1,124 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Cache-Control for public read endpoints; the CDN in front of the function honours s-maxage
+PUBLIC_MAX_AGE = int(os.environ.get("PUBLIC_CACHE_MAX_AGE", 60))
+PUBLIC_S_MAXAGE = int(os.environ.get("PUBLIC_CACHE_S_MAXAGE", 300))
+PUBLIC_STALE_WHILE_REVALIDATE = int(os.environ.get("PUBLIC_CACHE_STALE_WHILE_REVALIDATE", 600))
+
+VARIANT_SUFFIX = re.compile(r'-(?:br|gzip)"$')
+
+
+def public_cache_control(max_age: int = None, s_maxage: int = None, stale_while_revalidate: int = None) -> str:
+    return (
+        f"public, max-age={PUBLIC_MAX_AGE if max_age is None else max_age}"
+        f", s-maxage={PUBLIC_S_MAXAGE if s_maxage is None else s_maxage}"
+        f", stale-while-revalidate={PUBLIC_STALE_WHILE_REVALIDATE if stale_while_revalidate is None else stale_while_revalidate}"
+    )
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: identical bytes give identical tags on every instance
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    # A compressed representation's tag is the identity tag plus an encoding suffix
+    return etag in tags or etag in {VARIANT_SUFFIX.sub('"', tag) for tag in tags}
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def serialize(response_type: Any, content: Any) -> bytes:
+    """
+    Serialize `content` the way FastAPI would for `response_model=response_type`.
+    Validates on the way, so prefer `dump_json` for projected documents read straight from Mongo.
+    """
+    adapter = _adapter(response_type)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content: Any) -> bytes:
+    """
+    Encode plain documents straight from Motor, without building or validating models first.
+    Produces the same bytes as `serialize` for documents that already match the response model.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    # pydantic's own encoder writes the same bytes as `serialize`, far faster than the json module
+    return to_json(content, fallback=_default)
+
+
+@lru_cache(maxsize=None)
+def _wire_fields(model: type) -> Tuple[Tuple[str, bool, Any], ...]:
+    # (JSON key, required, default) per field, skipping fields left out of responses such as Beanie's
+    # revision_id (excluded, or marked hidden by older Beanie releases)
+    fields = []
+    for name, field in model.model_fields.items():
+        if field.exclude or (isinstance(field.json_schema_extra, dict) and field.json_schema_extra.get("hidden")):
+            continue
+        required = field.is_required()
+        fields.append((field.alias or name, required, None if required else field.get_default(call_default_factory=True)))
+    return tuple(fields)
+
+
+def projection(model: type[BaseModel], *extra: str) -> Dict[str, int]:
+    """
+    Mongo projection for exactly the fields `model` puts on the wire, plus `extra`.
+    """
+    fields = {key: 1 for key, _, _ in _wire_fields(model)}
+    fields.update({key: 1 for key in extra})
+    if "_id" not in fields:
+        fields["_id"] = 0
+    return fields
+
+
+def wire_document(model: type[BaseModel], document: dict) -> dict:
+    """
+    Shape a projected document like `model` would: missing optional fields get their defaults.
+    Values are trusted as stored, so nothing is coerced or validated.
+    """
+    for key, required, default in _wire_fields(model):
+        if not required and key not in document:
+            document[key] = default
+    return document
+
+
+def conditional_response(request: Request, body: bytes, etag: Optional[str] = None, cache_control: Optional[str] = None, media_type: str = "application/json", headers: Optional[dict] = None) -> Response:
+    etag = etag or make_etag(body)
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": cache_control or public_cache_control(),
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from classes.BlogContent import BlogContent
+from classes.EmailTemplate import EmailTemplate
+from classes.NewsLetterSignup import NewsletterSignup
+from classes.Post import Post
+from classes.PostRendition import PostRendition
+from classes.SendJob import SendJob, SendLog
+from classes.WaitlistSingup import WaitlistSignup
+
+# Every collection has this one whether or not it is declared
+ID_INDEX = IndexModel([("_id", ASCENDING)], name="_id_")
+
+# Strong reference to the background reconciliation so it is not garbage collected
+_task = None
+
+
+@dataclass
+class QueryShape:
+    router: str
+    handler: str
+    model: type
+    equality: Tuple[str, ...] = ()
+    range: Tuple[str, ...] = ()
+    sort: Tuple[Tuple[str, int], ...] = ()
+    # Intentional full scans, e.g. admin listings of a whole collection
+    full_scan: bool = False
+    # $text queries, which need the collection's text index
+    text: bool = False
+
+
+# The query shapes each router issues, kept next to the index declarations they rely on
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("routes/Post.py", "list_posts (page)", Post, sort=(("publish_date", DESCENDING), ("_id", DESCENDING))),
+    QueryShape("routes/Post.py", "list_posts (cursor)", Post, range=("publish_date", "_id"), sort=(("publish_date", DESCENDING), ("_id", DESCENDING))),
+    QueryShape("routes/Post.py", "search_posts", Post, text=True),
+    QueryShape("classes/Feeds.py", "PostFeeds._load", Post, full_scan=True),
+    QueryShape("routes/Post.py", "get_post", Post, equality=("_id",)),
+    QueryShape("routes/Post.py", "get_post_by_text_url", Post, equality=("text_url",)),
+    QueryShape("routes/Post.py", "get_post (rendition)", PostRendition, equality=("post_id",)),
+    QueryShape("routes/Post.py", "get_post_by_text_url (rendition)", PostRendition, equality=("text_url",)),
+    QueryShape("routes/BlogContent.py", "list_blog_contents", BlogContent, full_scan=True),
+    QueryShape("routes/BlogContent.py", "get_blog_page", BlogContent, equality=("page_name",)),
+    QueryShape("routes/BlogContent.py", "get_blog_content", BlogContent, equality=("page_name", "section_name")),
+    QueryShape("routes/EmailTemplate.py", "get_email_template", EmailTemplate, equality=("_id",)),
+    QueryShape("routes/Newsletter.py", "signup_for_newsletter", NewsletterSignup, equality=("email",)),
+    QueryShape("routes/Newsletter.py", "get_newsletter_users", NewsletterSignup, full_scan=True),
+    QueryShape("routes/Newsletter.py", "get_newsletter_users (export, active)", NewsletterSignup, equality=("isActive",), range=("_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("routes/Newsletter.py", "send_newsletter_notification", NewsletterSignup, equality=("isActive",)),
+    QueryShape("routes/Newsletter.py", "unsubscribe", NewsletterSignup, equality=("email",)),
+    QueryShape("routes/Waitlist.py", "signup_for_waitlist", WaitlistSignup, equality=("email",)),
+    QueryShape("routes/Waitlist.py", "get_waitlist_users", WaitlistSignup, full_scan=True),
+    QueryShape("routes/Waitlist.py", "get_waitlist_users (export, active)", WaitlistSignup, equality=("isActive",), range=("_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("routes/Waitlist.py", "send_waitlist_notification", WaitlistSignup, equality=("isActive",)),
+    QueryShape("routes/Waitlist.py", "unsubscribe", WaitlistSignup, equality=("email",)),
+    QueryShape("routes/Jobs.py", "get_job", SendJob, equality=("_id",)),
+    QueryShape("classes/SendJobWorker.py", "enqueue_send_job", SendJob, equality=("list_name", "post_id", "status")),
+    QueryShape("classes/SendJobWorker.py", "resume_jobs", SendJob, equality=("status",), range=("lease_until",)),
+    QueryShape("classes/SendJobWorker.py", "_drain (subscribers)", NewsletterSignup, equality=("isActive",), range=("_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("classes/SendJobWorker.py", "_drain (subscribers)", WaitlistSignup, equality=("isActive",), range=("_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("classes/SendJobWorker.py", "_drain (send log)", SendLog, equality=("post_id", "list_name", "email", "status")),
+    QueryShape("classes/SendGridEvents.py", "ingest_events (newsletter)", NewsletterSignup, equality=("email", "isActive")),
+    QueryShape("classes/SendGridEvents.py", "ingest_events (waitlist)", WaitlistSignup, equality=("email", "isActive")),
+]
+
+
+def declared_indexes(model) -> List[IndexModel]:
+    indexes = []
+    for index in getattr(model.Settings, "indexes", []):
+        if isinstance(index, IndexModel):
+            indexes.append(index)
+        elif isinstance(index, str):
+            indexes.append(IndexModel([(index, ASCENDING)]))
+        else:
+            indexes.append(IndexModel(index))
+    return indexes
+
+
+def _normalize_keys(keys) -> Tuple[Tuple[str, object], ...]:
+    normalized = []
+    for field, direction in keys:
+        if direction == "text":
+            # The server reports a text index as _fts/_ftsx, with the indexed fields kept in its weights
+            if ("_fts", "text") not in normalized:
+                normalized += [("_fts", "text"), ("_ftsx", 1)]
+            continue
+        # index_information() may report directions as floats (1.0) while IndexModel keeps ints
+        normalized.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return tuple(normalized)
+
+
+# Options that change what an index enforces or contains; an index with the right keys but other options is not the declared one
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def index_options(spec: dict) -> Dict[str, object]:
+    # Unset and false mean the same thing; the server omits them, IndexModel may not
+    return {option: spec[option] for option in INDEX_OPTIONS if spec.get(option) not in (None, False)}
+
+
+def index_keys(index: IndexModel) -> Tuple[Tuple[str, object], ...]:
+    return _normalize_keys(index.document["key"].items())
+
+
+def covers(index: IndexModel, shape: QueryShape) -> bool:
+    """
+    Rough equality-sort-range check: the index starts with equality fields, the sort follows
+    (in either direction), and range fields appear somewhere after the equality prefix.
+    """
+    if shape.text:
+        return ("_fts", "text") in index_keys(index)
+
+    partial = index.document.get("partialFilterExpression", {})
+    if any(field not in shape.equality for field in partial):
+        return False
+
+    keys = index_keys(index)
+    fields = [field for field, _ in keys]
+    position = 0
+    while position < len(fields) and fields[position] in shape.equality:
+        position += 1
+    # Equality fields past the prefix are applied as a residual filter on the scanned keys
+    if shape.equality and position == 0:
+        return False
+
+    if shape.sort:
+        segment = keys[position:position + len(shape.sort)]
+        if [field for field, _ in segment] != [field for field, _ in shape.sort]:
+            return False
+        directions = [(direction, wanted) for (_, direction), (_, wanted) in zip(segment, shape.sort)]
+        if not (all(d == w for d, w in directions) or all(d == -w for d, w in directions)):
+            return False
+        position += len(shape.sort)
+
+    remaining = set(fields[position:]) | {field for field, _ in shape.sort}
+    return all(field in remaining for field in shape.range)
+
+
+def coverage_report(shapes: Sequence[QueryShape] = QUERY_SHAPES) -> List[dict]:
+    report = []
+    for shape in shapes:
+        indexes = [ID_INDEX] + declared_indexes(shape.model)
+        covering = [index.document["name"] for index in indexes if covers(index, shape)]
+        report.append({
+            "router": shape.router,
+            "handler": shape.handler,
+            "collection": shape.model.Settings.collection,
+            "filter": (["$text"] if shape.text else []) + list(shape.equality) + [f"{field} (range)" for field in shape.range],
+            "sort": [f"{field} {'asc' if direction == ASCENDING else 'desc'}" for field, direction in shape.sort],
+            "index": covering[0] if covering else ("full scan by design" if shape.full_scan else None),
+        })
+    return report
+
+
+async def reconcile_indexes(models, drop_extra: bool = False, rebuild_mismatched: bool = False) -> Dict[str, dict]:
+    """
+    Create the declared indexes that are missing from each model's collection.
+
+    An existing index on the declared keys but with other options (say, not unique) is reported as
+    mismatched and only dropped and rebuilt when `rebuild_mismatched` is set. Indexes that exist in
+    the database but are no longer declared are reported, and only dropped when `drop_extra` is set.
+    Failures (e.g. duplicate data under a new unique index) are logged and do not stop the other
+    indexes from being built.
+    """
+    report = {}
+    for model in models:
+        collection = model.get_motor_collection()
+        existing = {_normalize_keys(info["key"]): (name, info) for name, info in (await collection.index_information()).items()}
+        declared = declared_indexes(model)
+        declared_keys = {index_keys(index) for index in declared}
+
+        created, failed, mismatched = [], [], []
+        for index in declared:
+            name = index.document["name"]
+            if index_keys(index) in existing:
+                current, info = existing[index_keys(index)]
+                wanted = index_options(index.document)
+                if index_options(info) == wanted:
+                    continue
+                logging.error(f"Index {current} on {collection.name} has options {index_options(info)}, declared {name} wants {wanted}")
+                mismatched.append(current)
+                if not rebuild_mismatched:
+                    failed.append(name)
+                    continue
+                await collection.drop_index(current)
+            try:
+                await collection.create_indexes([index])
+                created.append(name)
+            except OperationFailure as e:
+                logging.error(f"Could not create index {name} on {collection.name}: {e}")
+                failed.append(name)
+
+        extra = [name for keys, (name, _) in existing.items() if name != "_id_" and keys not in declared_keys]
+        if drop_extra:
+            for name in extra:
+                await collection.drop_index(name)
+
+        report[collection.name] = {"created": created, "failed": failed, "mismatched": mismatched, "undeclared": extra, "dropped": extra if drop_extra else []}
+        if created or failed or mismatched or extra:
+            logging.info(f"Index reconciliation for {collection.name}: {report[collection.name]}")
+    return report
+
+
+def start_index_reconciliation(models, drop_extra: bool = False, rebuild_mismatched: bool = False):
+    # Runs beside the first requests instead of holding up cold start
+    global _task
+    _task = asyncio.create_task(reconcile_indexes(models, drop_extra, rebuild_mismatched))
+    _task.add_done_callback(_log_failure)
+    return _task
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logging.error(f"Index reconciliation failed: {task.exception()}")
+
+
+def print_report():
+    rows = coverage_report()
+    uncovered = 0
+    for row in rows:
+        index = row["index"]
+        if index is None:
+            uncovered += 1
+        sort = f" sort [{', '.join(row['sort'])}]" if row["sort"] else ""
+        print(f"{row['router']:<28} {row['handler']:<32} {row['collection']:<15} filter [{', '.join(row['filter'])}]{sort} -> {index or 'NOT COVERED'}")
+    print(f"\n{len(rows)} query shapes, {uncovered} not covered by an index")
+    return uncovered
+
+
+# Usage: python -m classes.Indexes report
+if __name__ == "__main__":
+    if sys.argv[1:] != ["report"]:
+        print("Usage: python -m classes.Indexes report")
+        sys.exit(2)
+    sys.exit(1 if print_report() else 0)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from classes.Compression import compress
+from classes.HttpCache import dump_json
+from classes.Metrics import metrics
+
+# SendGrid rejects mail/send requests with more than 1000 personalizations
+MAX_BATCH_SIZE = 1000
+
+# mail/send accepts gzip request bodies
+GZIP_REQUESTS = os.environ.get("SENDGRID_GZIP", "true") != "false"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class Recipient:
+    email: str
+    # Placeholder -> value pairs that SendGrid swaps into the subject and body of this recipient's copy
+    substitutions: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class BatchResult:
+    batch: int
+    recipients: int
+    attempts: int
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    # The request may have reached SendGrid before it failed, so the mail may or may not have gone out
+    unknown: bool = False
+    emails: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FanoutResult:
+    batches: List[BatchResult] = field(default_factory=list)
+
+    @property
+    def sent(self) -> int:
+        return sum(batch.recipients for batch in self.batches if batch.ok)
+
+    # Rejected or never delivered, so safe to send again
+    @property
+    def failed(self) -> int:
+        return sum(batch.recipients for batch in self.batches if not batch.ok and not batch.unknown)
+
+    @property
+    def unknown(self) -> int:
+        return sum(batch.recipients for batch in self.batches if batch.unknown)
+
+    def failed_emails(self) -> List[str]:
+        return [email for batch in self.batches if not batch.ok and not batch.unknown for email in batch.emails]
+
+    def unknown_emails(self) -> List[str]:
+        return [email for batch in self.batches if batch.unknown for email in batch.emails]
+
+    def summary(self) -> dict:
+        return {
+            "batches": len(self.batches),
+            "batches_failed": sum(1 for batch in self.batches if not batch.ok),
+            "emails_sent": self.sent,
+            "emails_failed": self.failed,
+            "emails_unknown": self.unknown,
+        }
+
+
+class MailFanout():
+    """
+    Sends one message to many recipients through SendGrid's mail/send API, packing up to
+    `batch_size` recipients into each request as separate personalizations.
+
+    Batches go out concurrently (bounded by `concurrency`) over a shared pooled HTTP client and
+    are retried with exponential backoff on 429/5xx and on errors raised before the request went out.
+    Any other transport error leaves the outcome unknown and is not retried, since SendGrid may
+    already have accepted the batch. Point SENDGRID_API_URL at a local fake
+    server to exercise it without touching SendGrid.
+    """
+    __client: Optional["httpx.AsyncClient"] = None
+
+    def __init__(self, batch_size: int = None, concurrency: int = None, max_retries: int = None):
+        self.batch_size = min(batch_size or int(os.environ.get("SENDGRID_BATCH_SIZE", 500)), MAX_BATCH_SIZE)
+        self.concurrency = concurrency or int(os.environ.get("SENDGRID_CONCURRENCY", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("SENDGRID_MAX_RETRIES", 4))
+
+    @classmethod
+    def client(cls) -> "httpx.AsyncClient":
+        # httpx is imported on first send so it stays off the cold start path
+        import httpx
+        if cls.__client is None or cls.__client.is_closed:
+            cls.__client = httpx.AsyncClient(
+                base_url=os.environ.get("SENDGRID_API_URL", "https://api.sendgrid.com"),
+                headers={"Authorization": f"Bearer {os.environ.get('SENDGRID_API_KEY')}"},
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return cls.__client
+
+    @classmethod
+    async def close(cls):
+        if cls.__client is not None:
+            await cls.__client.aclose()
+            cls.__client = None
+
+    async def send(
+        self,
+        recipients: Sequence[Recipient],
+        subject: str,
+        content: str,
+        from_email: str = None,
+        custom_args: Dict[str, str] = None,
+        before_batch: Callable[[Sequence[Recipient]], Awaitable] = None,
+        after_batch: Callable[[BatchResult], Awaitable] = None,
+    ) -> FanoutResult:
+        """
+        `before_batch` runs right before each batch's request and `after_batch` as soon as it has an
+        outcome, so callers can keep a per-batch delivery log. A failing `before_batch` skips the batch,
+        which is reported failed (never sent) to `after_batch` while the other batches go on.
+        """
+        message = {
+            "from": {"email": from_email or os.environ.get("SENDGRID_FROM_EMAIL")},
+            "subject": subject,
+            "content": [{"type": "text/html", "value": content}],
+        }
+        if custom_args:
+            # Echoed back on every event webhook payload for these messages
+            message["custom_args"] = custom_args
+        batches = [recipients[i:i + self.batch_size] for i in range(0, len(recipients), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(index: int, batch: Sequence[Recipient]) -> BatchResult:
+            async with semaphore:
+                try:
+                    if before_batch is not None:
+                        await before_batch(batch)
+                except Exception as e:
+                    logging.error(f"SendGrid batch {index} skipped, preparing it failed: {e}")
+                    result = BatchResult(batch=index, recipients=len(batch), attempts=0, error=f"before_batch: {type(e).__name__}: {e}", emails=[recipient.email for recipient in batch])
+                else:
+                    result = await self._send_batch(index, batch, message)
+                if after_batch is not None:
+                    await after_batch(result)
+                return result
+
+        results = await asyncio.gather(*(run(index, batch) for index, batch in enumerate(batches)))
+        return FanoutResult(batches=list(results))
+
+    async def _send_batch(self, index: int, batch: Sequence[Recipient], message: dict) -> BatchResult:
+        import httpx
+        # Raised before any byte of the request was written, so a retry cannot duplicate the mail
+        unsent_errors = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        payload = dump_json(dict(message, personalizations=[self._personalization(recipient) for recipient in batch]))
+        headers = {"Content-Type": "application/json"}
+        if GZIP_REQUESTS:
+            # The post content dominates every batch; compressed once here and reused on retries
+            payload = compress(payload, "gzip", 6)
+            headers["Content-Encoding"] = "gzip"
+        result = BatchResult(batch=index, recipients=len(batch), attempts=0, emails=[recipient.email for recipient in batch])
+
+        while True:
+            result.attempts += 1
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = await self.client().post("/v3/mail/send", content=payload, headers=headers)
+            except httpx.TransportError as e:
+                result.status_code, result.error = None, f"{type(e).__name__}: {e}"
+                metrics.observe("outbound_request_duration_seconds", {"service": "sendgrid", "status": "error"}, time.perf_counter() - started)
+                if not isinstance(e, unsent_errors):
+                    # e.g. a read timeout: resending could deliver the whole batch twice
+                    result.unknown = True
+                    break
+            else:
+                metrics.observe("outbound_request_duration_seconds", {"service": "sendgrid", "status": str(response.status_code)}, time.perf_counter() - started)
+                result.status_code = response.status_code
+                if response.status_code < 300:
+                    result.error = None
+                    return result
+                result.error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get("Retry-After")
+
+            if result.attempts > self.max_retries:
+                break
+            await asyncio.sleep(self._backoff(result.attempts, retry_after))
+
+        outcome = "outcome unknown" if result.unknown else "failed"
+        logging.error(f"SendGrid batch {index} ({len(batch)} recipients) {outcome} after {result.attempts} attempts: {result.error}")
+        return result
+
+    @staticmethod
+    def _personalization(recipient: Recipient) -> dict:
+        personalization = {"to": [{"email": recipient.email}]}
+        if recipient.substitutions:
+            personalization["substitutions"] = recipient.substitutions
+        return personalization
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Exponential backoff with full jitter, capped at 30 seconds
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
@@ -0,0 +1,210 @@
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# ASGI scope of the request being served; the router fills in scope["route"] once it has matched
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+class Histogram():
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry():
+    """
+    Minimal in-process counters and histograms rendered in the Prometheus text format.
+    Updated from the event loop and from Motor's executor threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, help: str):
+        self._help[name] = ("counter", help)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._help[name] = ("histogram", help)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        # collect() yields (name, help, labels, value) gauges at scrape time
+        self._collectors.append(collect)
+
+    def inc(self, name: str, labels: Dict[str, str], amount: float = 1.0):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, labels: Dict[str, str], value: float):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, labels: Dict[str, str]):
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(name, labels, time.perf_counter() - started)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += self._header(name)
+                lines += [f"{name}{_labels(key)} {value:g}" for key, value in series.items()]
+            for name, series in self._histograms.items():
+                lines += self._header(name)
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key + (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for collect in self._collectors:
+            for name, help, labels, value in collect():
+                gauges.setdefault(name, (help, []))[1].append(f"{name}{_labels(tuple(sorted(labels.items())))} {value:g}")
+        for name, (help, samples) in gauges.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", *samples]
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str) -> List[str]:
+        kind, help = self._help[name]
+        return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in key) + "}"
+
+
+metrics = Registry()
+metrics.counter("http_requests_total", "HTTP requests by route, method and status code")
+metrics.histogram("http_request_duration_seconds", "HTTP request latency by route and method (sampled on read routes)")
+metrics.counter("mongo_commands_total", "MongoDB commands by issuing route, command and outcome (successful reads estimated from a sample)")
+metrics.histogram("mongo_command_duration_seconds", "MongoDB command latency by issuing route and command (sampled on reads)")
+metrics.counter("mongo_primary_pinned_total", "Reads sent to the primary because this instance recently wrote the collection")
+metrics.histogram("outbound_request_duration_seconds", "Latency of calls to external services")
+metrics.counter("admission_rejections_total", "Requests turned away by admission control, by limit and reason")
+
+
+def route_name(scope: Optional[dict]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware():
+    """
+    ASGI middleware recording request counts by status and latency histograms per route template.
+    Latency on GET/HEAD is sampled at `sample_rate` to keep the hot read paths cheap.
+    """
+
+    def __init__(self, app, sample_rate: float = None):
+        self.app = app
+        self.sample_rate = float(os.environ.get("METRICS_SAMPLE_RATE", 1.0)) if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+        token = current_scope.set(scope)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_scope.reset(token)
+            method = scope["method"]
+            route = route_name(scope)
+            metrics.inc("http_requests_total", {"route": route, "method": method, "status": str(status)})
+            if method not in ("GET", "HEAD") or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                metrics.observe("http_request_duration_seconds", {"route": route, "method": method}, time.perf_counter() - started)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Attributes every MongoDB command to the route whose request issued it. Motor copies the caller's
+    context into its executor threads, so the current request scope is visible here.
+
+    Like request latency, successful reads are sampled at `sample_rate`; each sampled one counts for
+    1 / `sample_rate` commands. Writes and failures are always recorded.
+    """
+
+    READ_COMMANDS = {"find", "getMore", "aggregate", "count", "distinct"}
+
+    def __init__(self, sample_rate: float = None):
+        self.sample_rate = float(os.environ.get("METRICS_SAMPLE_RATE", 1.0)) if sample_rate is None else sample_rate
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if self.sample_rate >= 1.0 or event.command_name not in self.READ_COMMANDS:
+            self._record(event, "ok")
+        elif random.random() < self.sample_rate:
+            self._record(event, "ok", 1.0 / self.sample_rate)
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    @staticmethod
+    def _record(event, outcome: str, weight: float = 1.0):
+        route = route_name(current_scope.get())
+        metrics.inc("mongo_commands_total", {"route": route, "command": event.command_name, "outcome": outcome}, weight)
+        metrics.observe("mongo_command_duration_seconds", {"route": route, "command": event.command_name}, event.duration_micros / 1_000_000)
+
+
+command_metrics = CommandMetrics()
@@ -1,5 +1,6 @@
 from beanie import Document
 from pydantic import EmailStr
+from pymongo import IndexModel, ASCENDING
 
 # Models for MongoDB
 class NewsletterSignup(Document):
@@ -9,4 +10,9 @@ class NewsletterSignup(Document):
     isActive: bool = True
 
     class Settings:
-        collection = "newsletter"
\ No newline at end of file
+        collection = "newsletter"
+        indexes = [
+            IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+            # Only active subscribers are ever scanned by the send paths
+            IndexModel([("isActive", ASCENDING), ("_id", ASCENDING)], partialFilterExpression={"isActive": True}, name="active_subscribers"),
+        ]
\ No newline at end of file
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from pymongo import monitoring
+
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PoolTelemetry(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that tracks open and checked-out connections per server and how long
+    each checkout waited for a connection. Events arrive on Motor's executor threads, hence the lock.
+    """
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.pools: Dict[str, dict] = {}
+
+    @staticmethod
+    def _key(address) -> str:
+        return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+    def _pool(self, address) -> dict:
+        key = self._key(address)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {"open": 0, "in_use": 0, "max_in_use": 0, "cleared": 0}
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(self._key(event.address), None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        # Checkout start and finish are reported on the thread doing the checkout
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        # Newer pymongo reports the wait itself; otherwise time it from the started event
+        wait = getattr(event, "duration", None)
+        if wait is None:
+            started = getattr(self._local, "started", None)
+            wait = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["in_use"] += 1
+            pool["max_in_use"] = max(pool["max_in_use"], pool["in_use"])
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self._waits.append(wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._pool(event.address)["in_use"] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "pools": {address: dict(pool) for address, pool in self.pools.items()},
+                "checkout": {
+                    "count": self.checkouts,
+                    "failed": dict(self.checkout_failures),
+                    "avg_wait_ms": round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                    "p50_wait_ms": round(1000 * percentile(waits, 0.50), 3),
+                    "p95_wait_ms": round(1000 * percentile(waits, 0.95), 3),
+                    "p99_wait_ms": round(1000 * percentile(waits, 0.99), 3),
+                    "max_wait_ms": round(1000 * self.wait_max, 3),
+                },
+            }
+
+
+pool_telemetry = PoolTelemetry()
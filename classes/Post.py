@@ -1,8 +1,8 @@
-from typing import List, Optional
-from pydantic import Field
+from typing import Optional
 from beanie import Document
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
 
 
 class Post(Document):
@@ -20,6 +20,16 @@ class Post(Document):
 
     class Settings:
         collection = "posts"
+        indexes = [
+            IndexModel([("text_url", ASCENDING)], unique=True, name="text_url_unique"),
+            IndexModel([("publish_date", DESCENDING), ("_id", DESCENDING)], name="publish_date_id"),
+            # Backs /posts/search; a title match outranks the same word in the body
+            IndexModel(
+                [("title", TEXT), ("subtitle", TEXT), ("summary", TEXT), ("body", TEXT)],
+                weights={"title": 10, "subtitle": 5, "summary": 3, "body": 1},
+                name="post_text",
+            ),
+        ]
     
     class Config():
         json_encoders={
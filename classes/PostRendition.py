@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+
+from classes.Compression import compress_variants
+from classes.Consistency import collection_for
+
+# Models for MongoDB
+class PostRendition(Document):
+    """
+    The serialized single-post response, compressed once at write time in every encoding it is served in.
+    """
+    post_id: PydanticObjectId
+    text_url: str
+    identity: bytes
+    gzip: bytes
+    br: Optional[bytes] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        collection = "post_renditions"
+        indexes = [
+            IndexModel([("post_id", ASCENDING)], unique=True, name="post_id_unique"),
+            IndexModel([("text_url", ASCENDING)], name="text_url"),
+        ]
+
+
+async def save_rendition(post_id, text_url: str, body: bytes) -> Dict[str, bytes]:
+    # Maximum-effort brotli on a long article takes a while, keep it off the event loop
+    variants = await asyncio.to_thread(compress_variants, body)
+    await collection_for(PostRendition).update_one(
+        {"post_id": post_id},
+        {"$set": {"text_url": text_url, "br": None, **variants, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    return variants
+
+
+async def load_variant(query: dict, encoding: str) -> Optional[bytes]:
+    rendition = await collection_for(PostRendition).find_one(query, {"_id": 0, encoding: 1})
+    return rendition.get(encoding) if rendition else None
+
+
+async def rendered_post_ids() -> set:
+    return set(await collection_for(PostRendition).distinct("post_id"))
+
+
+async def delete_rendition(post_id):
+    await collection_for(PostRendition).delete_one({"post_id": post_id})
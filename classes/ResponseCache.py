@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from classes.HttpCache import make_etag
+from classes.SingleFlight import SingleFlight
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class ResponseCache():
+    """
+    Read-through cache of already-serialized response bodies, bounded by their total size in bytes.
+
+    Concurrent misses for the same key share a single load. Entries also expire after `ttl` seconds,
+    which bounds how long another instance's writes can go unnoticed here.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 300.0, max_entry_bytes: int = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self._loads = SingleFlight()
+        # Bumped by every invalidation so loads that started before a write are not cached
+        self._generation = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self._remove(key)
+
+        async def load() -> Optional[CachedBody]:
+            self.misses += 1
+            generation = self._generation
+            body = await loader()
+            entry = None if body is None else CachedBody(body, make_etag(body), time.monotonic() + self.ttl)
+            if entry is not None and generation == self._generation:
+                self._put(key, entry)
+            return entry
+
+        return await self._loads.do(key, load)
+
+    @property
+    def coalesced(self) -> int:
+        return self._loads.coalesced
+
+    def invalidate(self, *keys: str):
+        self._generation += 1
+        for key in keys:
+            self._remove(key)
+
+    def invalidate_prefix(self, prefix: str):
+        self._generation += 1
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _put(self, key: str, entry: CachedBody):
+        if len(entry.body) > self.max_entry_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
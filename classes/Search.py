@@ -0,0 +1,68 @@
+import html
+import re
+from typing import List
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+TERM_PATTERN = re.compile(r'-?"[^"]*"|-?\S+')
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    # $text matching is case-insensitive, so queries differing only in case share a cache entry
+    return " ".join(query.split()).lower()
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Words to highlight for a $text query: quoted phrases and plain words, minus negated ones.
+    """
+    terms = []
+    for token in TERM_PATTERN.findall(query):
+        if token.startswith("-"):
+            continue
+        terms += [word.lower() for word in WORD_PATTERN.findall(token)]
+    return list(dict.fromkeys(terms))
+
+
+def plain_text(markup: str) -> str:
+    return " ".join(html.unescape(TAG_PATTERN.sub(" ", markup or "")).split())
+
+
+def leading_text(markup: str, width: int = 160) -> str:
+    text = plain_text(markup)
+    if len(text) <= width:
+        return html.escape(text)
+    return html.escape(text[:text.rfind(" ", 0, width) if " " in text[:width] else width]) + " …"
+
+
+def snippet(markup: str, terms: List[str], width: int = 160) -> str:
+    """
+    An HTML-escaped excerpt of `markup` around the first matching term, with every term wrapped in <mark>.
+    Words are matched by prefix so that "run" also marks "running", roughly like the server's stemming.
+    Returns "" when no term occurs in the text.
+    """
+    if not terms:
+        return ""
+    text = plain_text(markup)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)) + r")\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    if not first:
+        return ""
+
+    start = max(0, first.start() - width // 3)
+    end = min(len(text), start + width)
+    # Do not cut words in half at either end
+    if start > 0:
+        start = min(text.find(" ", start) + 1 or start, first.start())
+    if end < len(text):
+        space = text.rfind(" ", first.end(), end)
+        end = space if space > 0 else end
+
+    excerpt, position, parts = text[start:end], 0, []
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(html.escape(excerpt[position:]))
+
+    return ("… " if start > 0 else "") + "".join(parts) + (" …" if end < len(text) else "")
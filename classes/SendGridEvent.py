@@ -0,0 +1,19 @@
+from datetime import datetime
+from pydantic import Field
+from beanie import Document
+from pymongo import IndexModel, ASCENDING
+
+# Models for MongoDB
+class SendGridEvent(Document):
+    sg_event_id: str
+    event: str
+    email: str
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        collection = "sendgrid_events"
+        indexes = [
+            IndexModel([("sg_event_id", ASCENDING)], unique=True, name="sg_event_id_unique"),
+            # SendGrid retries deliveries for at most 24 hours, so a month of ids is plenty for deduplication
+            IndexModel([("received_at", ASCENDING)], expireAfterSeconds=30 * 24 * 60 * 60, name="received_at_ttl"),
+        ]
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Set
+
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+
+from classes.SendGridEvent import SendGridEvent
+from classes.SubscriberList import SUBSCRIBER_LISTS, normalize_email
+from classes.Consistency import collection_for
+
+# Events after which an address must not be mailed again
+LIST_EVENTS = {"unsubscribe", "group_unsubscribe"}
+# Only drops caused by the address itself deactivate it; e.g. oversized messages do not
+DROP_REASONS = ("bounced address", "unsubscribed address", "spam reporting address", "invalid")
+EMAILS_PER_UPDATE = 1000
+
+
+def deactivates(event: dict) -> bool:
+    kind = event.get("event")
+    if kind in LIST_EVENTS or kind == "spamreport":
+        return True
+    if kind == "bounce":
+        # "blocked" bounces are temporary; only hard bounces deactivate
+        return event.get("type", "bounce") == "bounce"
+    if kind == "dropped":
+        return str(event.get("reason", "")).lower().startswith(DROP_REASONS)
+    return False
+
+
+async def _new_events(events: List[dict]) -> List[dict]:
+    """
+    Drop events repeated within the batch or already applied from an earlier delivery.
+    """
+    unique, seen = [], set()
+    for event in events:
+        event_id = event.get("sg_event_id")
+        if event_id in seen:
+            continue
+        if event_id:
+            seen.add(event_id)
+        unique.append(event)
+
+    if not seen:
+        return unique
+    applied = set(await collection_for(SendGridEvent).distinct("sg_event_id", {"sg_event_id": {"$in": list(seen)}}))
+    return [event for event in unique if event.get("sg_event_id") not in applied]
+
+
+async def _record_events(events: List[dict]):
+    """
+    Remember the sg_event_ids of applied events, so SendGrid's redeliveries are recognised.
+    """
+    now = datetime.utcnow()
+    documents = [{"sg_event_id": event["sg_event_id"], "event": event.get("event"), "email": event.get("email"), "received_at": now} for event in events if event.get("sg_event_id")]
+    if not documents:
+        return
+    try:
+        await collection_for(SendGridEvent).insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent delivery of the same events recorded them first
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def ingest_events(events: List[dict]) -> dict:
+    """
+    Apply a batched SendGrid event webhook payload: deactivate bounced, dropped, spam-reporting and
+    unsubscribed addresses with one bulk_write per subscriber list.
+
+    The events are only recorded once every deactivation has been written. If a write fails, SendGrid
+    redelivers the batch and it is applied again; deactivating twice is harmless.
+    """
+    relevant = [event for event in events if event.get("email") and deactivates(event)]
+    fresh = await _new_events(relevant)
+
+    emails: Dict[str, Set[str]] = {list_name: set() for list_name in SUBSCRIBER_LISTS}
+    for event in fresh:
+        list_name = event.get("list")
+        # An unsubscribe applies to the list the mail came from; a bad address is bad on every list
+        targets = [list_name] if event["event"] in LIST_EVENTS and list_name in SUBSCRIBER_LISTS else list(SUBSCRIBER_LISTS)
+        for target in targets:
+            emails[target].add(normalize_email(event["email"]))
+
+    deactivated = {}
+    for list_name, addresses in emails.items():
+        if not addresses:
+            continue
+        addresses = sorted(addresses)
+        operations = [
+            UpdateMany({"email": SUBSCRIBER_LISTS[list_name].email_filter(chunk), "isActive": True}, {"$set": {"isActive": False}})
+            for chunk in (addresses[i:i + EMAILS_PER_UPDATE] for i in range(0, len(addresses), EMAILS_PER_UPDATE))
+        ]
+        result = await collection_for(SUBSCRIBER_LISTS[list_name].model).bulk_write(operations, ordered=False)
+        deactivated[list_name] = result.modified_count
+
+    await _record_events(fresh)
+
+    if deactivated:
+        logging.info(f"SendGrid events deactivated subscribers: {deactivated}")
+    return {"received": len(events), "applied": len(fresh), "duplicates": len(relevant) - len(fresh), "deactivated": deactivated}
@@ -0,0 +1,53 @@
+from typing import Optional
+from datetime import datetime
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING
+
+
+# Models for MongoDB
+class SendJob(Document):
+    list_name: str
+    post_id: str
+    template_id: str
+    from_email: Optional[str] = None
+    status: str = "queued"  # queued | running | completed | failed
+    # _id of the last subscriber whose chunk was fully processed
+    checkpoint: Optional[PydanticObjectId] = None
+    lease_until: Optional[datetime] = None
+    total: int = 0
+    processed: int = 0
+    sent: int = 0
+    failed: int = 0
+    # Batches whose request failed after it may have reached SendGrid; never resent
+    unknown: int = 0
+    skipped: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        collection = "send_jobs"
+        indexes = [
+            IndexModel([("list_name", ASCENDING), ("post_id", ASCENDING), ("status", ASCENDING)], name="list_post_status"),
+            # At most one queued or running job per blast; $in in a partial filter needs MongoDB 6.0+
+            IndexModel([("list_name", ASCENDING), ("post_id", ASCENDING)], unique=True, partialFilterExpression={"status": {"$in": ["queued", "running"]}}, name="active_job_unique"),
+            IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        ]
+
+
+class SendLog(Document):
+    post_id: str
+    list_name: str
+    email: str
+    status: str  # sending | sent | failed | unknown
+    job_id: PydanticObjectId
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        collection = "send_logs"
+        indexes = [
+            IndexModel([("post_id", ASCENDING), ("list_name", ASCENDING), ("email", ASCENDING)], unique=True, name="post_recipient_unique"),
+        ]
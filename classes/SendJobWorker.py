@@ -0,0 +1,175 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from classes.Background import spawn
+from classes.EmailTemplate import EmailTemplate
+from classes.MailFanout import MailFanout, Recipient
+from classes.NewsLetterSignup import NewsletterSignup
+from classes.Post import Post
+from classes.SendJob import SendJob, SendLog
+from classes.SubscriberList import unsubscribe_link
+from classes.WaitlistSingup import WaitlistSignup
+
+SUBSCRIBER_LISTS = {"newsletter": NewsletterSignup, "waitlist": WaitlistSignup}
+ACTIVE_STATUSES = ["queued", "running"]
+CHUNK_SIZE = int(os.environ.get("SEND_JOB_CHUNK_SIZE", 1000))
+# A worker must finish a chunk within its lease, otherwise another instance may pick the job up
+LEASE_SECONDS = int(os.environ.get("SEND_JOB_LEASE_SECONDS", 300))
+
+
+def render_post_message(post: Post, template: EmailTemplate) -> Tuple[str, str]:
+    # Post-level slots are bound once; [name] and [unsubscribe_link] stay in place for SendGrid substitutions
+    compiled = template.compiled().bind({
+        "content": post.mail_content,
+        "link": f"https://journey.thehightabl.com/posts/article/{post.id}",
+        "title": post.title,
+        "summary": post.summary,
+    })
+    subject, content = compiled.source()
+    if post.mail_subject:
+        subject = post.mail_subject.replace("[title]", post.title)
+    return subject, content
+
+
+async def enqueue_send_job(list_name: str, post_id: str, template_id: str, from_email: str = None) -> SendJob:
+    # Re-triggering a blast that is still in flight returns the existing job instead of starting a second one
+    def active():
+        return SendJob.find_one(SendJob.list_name == list_name, SendJob.post_id == post_id, In(SendJob.status, ACTIVE_STATUSES))
+
+    job = await active()
+    if not job:
+        job = SendJob(list_name=list_name, post_id=post_id, template_id=template_id, from_email=from_email)
+        try:
+            await job.insert()
+        except DuplicateKeyError:
+            # A simultaneous trigger inserted the active job first; the active_job_unique index kept it the only one
+            job = await active()
+            if not job:
+                raise
+    start_worker(job.id)
+    return job
+
+
+def start_worker(job_id: PydanticObjectId):
+    spawn(run_job(job_id), name=f"send-job-{job_id}")
+
+
+async def resume_jobs() -> int:
+    """
+    Restart every unfinished job whose lease has expired, e.g. because the instance running it was recycled.
+    """
+    now = datetime.utcnow()
+    jobs = await SendJob.find({"status": {"$in": ACTIVE_STATUSES}, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]}).to_list()
+    for job in jobs:
+        start_worker(job.id)
+    return len(jobs)
+
+
+async def _claim(job_id: PydanticObjectId) -> Optional[dict]:
+    now = datetime.utcnow()
+    return await SendJob.get_motor_collection().find_one_and_update(
+        {"_id": job_id, "status": {"$in": ACTIVE_STATUSES}, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+        {"$set": {"status": "running", "lease_until": now + timedelta(seconds=LEASE_SECONDS), "updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def run_job(job_id: PydanticObjectId):
+    if not await _claim(job_id):
+        # Finished, or another worker holds the lease
+        return
+
+    job = await SendJob.get(job_id)
+    try:
+        await _drain(job)
+    except Exception as e:
+        logging.error(f"Send job {job_id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+        job.lease_until = None
+        job.finished_at = datetime.utcnow()
+        await job.save()
+
+
+async def _drain(job: SendJob):
+    post = await Post.get(job.post_id)
+    template = await EmailTemplate.get_cached(job.template_id)
+    if not post or not template:
+        raise ValueError("Post or email template no longer exists")
+
+    subject, content = render_post_message(post, template)
+    collection = SUBSCRIBER_LISTS[job.list_name].get_motor_collection()
+    send_logs = SendLog.get_motor_collection()
+
+    if job.started_at is None:
+        job.started_at = datetime.utcnow()
+        job.total = await collection.count_documents({"isActive": True})
+        await job.save()
+
+    log_key = {"post_id": job.post_id, "list_name": job.list_name}
+
+    async def mark_sending(batch):
+        now = datetime.utcnow()
+        await send_logs.bulk_write([
+            UpdateOne({**log_key, "email": recipient.email}, {"$set": {"status": "sending", "job_id": job.id, "updated_at": now}}, upsert=True)
+            for recipient in batch
+        ], ordered=False)
+
+    async def record(batch):
+        status = "sent" if batch.ok else "unknown" if batch.unknown else "failed"
+        await send_logs.update_many({**log_key, "email": {"$in": batch.emails}}, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
+
+    while True:
+        query = {"isActive": True}
+        if job.checkpoint:
+            query["_id"] = {"$gt": job.checkpoint}
+        chunk = await collection.find(query, {"email": 1, "name": 1}).sort("_id", 1).limit(CHUNK_SIZE).to_list(None)
+        if not chunk:
+            break
+
+        # "sending" is left behind when the instance stopped while that batch's request was in flight, and
+        # an unknown delivery may well have arrived; sending either again risks a duplicate
+        already_sent = set(await send_logs.distinct("email", {**log_key, "email": {"$in": [user["email"] for user in chunk]}, "status": {"$in": ["sent", "sending", "unknown"]}}))
+        pending = [user for user in chunk if user["email"] not in already_sent]
+
+        failed, unknown = set(), set()
+        if pending:
+            recipients = [
+                Recipient(email=user["email"], substitutions={
+                    "[name]": user["name"],
+                    "[unsubscribe_link]": unsubscribe_link(job.list_name, user["email"]),
+                })
+                for user in pending
+            ]
+            # Each batch is logged as it goes out and again as it returns, so a crash or a failed log
+            # write resends nothing that SendGrid may have accepted
+            result = await MailFanout().send(
+                recipients, subject, content, job.from_email,
+                custom_args={"list": job.list_name, "post_id": job.post_id},
+                before_batch=mark_sending,
+                after_batch=record,
+            )
+            failed, unknown = set(result.failed_emails()), set(result.unknown_emails())
+
+        now = datetime.utcnow()
+        job.checkpoint = chunk[-1]["_id"]
+        job.processed += len(chunk)
+        job.sent += len(pending) - len(failed) - len(unknown)
+        job.failed += len(failed)
+        job.unknown += len(unknown)
+        job.skipped += len(chunk) - len(pending)
+        job.updated_at = now
+        job.lease_until = now + timedelta(seconds=LEASE_SECONDS)
+        await job.save()
+
+    job.status = "completed"
+    job.lease_until = None
+    job.finished_at = job.updated_at = datetime.utcnow()
+    await job.save()
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight():
+    """
+    Runs one call per key at a time: callers that ask for a key while its call is in flight wait for
+    and share that call's result or exception instead of starting their own.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # A waiter that gives up must not cancel the call the others are waiting on
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved even when nobody else was waiting on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await call()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,118 @@
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from fastapi import Request, Response
+from classes.Compression import compress_variants, parse_accept_encoding, variant_etag
+from classes.HttpCache import etag_matches, make_etag, public_cache_control
+
+ASSET_DIR = os.environ.get("HTML_TEMPLATES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "html_templates"))
+
+
+@dataclass(frozen=True)
+class Asset:
+    name: str
+    media_type: str
+    mtime: float
+    last_modified: str
+    etag: str
+    # Content-Encoding -> body, always including "identity"
+    variants: Mapping[str, bytes]
+
+    def negotiate(self, accept_encoding: str) -> str:
+        accepted = parse_accept_encoding(accept_encoding)
+        # Smallest acceptable variant wins
+        candidates = [encoding for encoding in self.variants if encoding == "identity" or accepted.get(encoding, accepted.get("*", 0)) > 0]
+        return min(candidates, key=lambda encoding: len(self.variants[encoding]))
+
+    def variant_etag(self, encoding: str) -> str:
+        return variant_etag(self.etag, encoding)
+
+
+def load_asset(path: str) -> Asset:
+    with open(path, "rb") as file:
+        body = file.read()
+    mtime = os.path.getmtime(path)
+
+    variants = compress_variants(body)
+
+    name = os.path.basename(path)
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+    return Asset(
+        name=name,
+        media_type=media_type,
+        mtime=mtime,
+        last_modified=formatdate(mtime, usegmt=True),
+        etag=make_etag(body),
+        variants=MappingProxyType(variants),
+    )
+
+
+class StaticAssets():
+    """
+    Immutable in-memory table of the files in a directory, each compressed once up front.
+
+    With `reload` set (local development), an asset is re-read whenever its file changes on disk.
+    """
+
+    def __init__(self, directory: str, reload: bool = False):
+        self.directory = directory
+        self.reload = reload
+        self._assets: Optional[Mapping[str, Asset]] = None
+
+    def load(self):
+        assets = {}
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                assets[name] = load_asset(path)
+        self._assets = MappingProxyType(assets)
+        logging.info(f"Loaded {len(assets)} static assets from {self.directory}")
+
+    def get(self, name: str) -> Asset:
+        if self._assets is None:
+            self.load()
+        asset = self._assets[name]
+
+        if self.reload:
+            path = os.path.join(self.directory, name)
+            if os.path.getmtime(path) != asset.mtime:
+                asset = load_asset(path)
+                self._assets = MappingProxyType({**self._assets, name: asset})
+        return asset
+
+    def response(self, request: Request, name: str, cache_control: str = None) -> Response:
+        asset = self.get(name)
+        encoding = asset.negotiate(request.headers.get("accept-encoding"))
+        etag = asset.variant_etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": cache_control or public_cache_control(),
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if etag_matches(request, etag) or (not request.headers.get("if-none-match") and self._not_modified_since(request, asset)):
+            return Response(status_code=304, headers=headers)
+        return Response(content=asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+    @staticmethod
+    def _not_modified_since(request: Request, asset: Asset) -> bool:
+        header = request.headers.get("if-modified-since")
+        if not header:
+            return False
+        try:
+            return int(asset.mtime) <= parsedate_to_datetime(header).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+
+static_assets = StaticAssets(ASSET_DIR, reload=os.environ.get("STATIC_ASSETS_RELOAD") == "true")
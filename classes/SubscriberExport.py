@@ -0,0 +1,81 @@
+import csv
+import io
+from typing import AsyncIterator, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from classes.HttpCache import dump_json
+from classes.Consistency import collection_for
+
+EXPORT_FIELDS = ("name", "location", "email", "isActive")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown export fields: {', '.join(unknown)}")
+    return selected
+
+
+async def _rows(collection, fields: List[str], active: Optional[bool], after: Optional[str], batch_size: int) -> AsyncIterator[dict]:
+    query = {}
+    if active is not None:
+        query["isActive"] = active
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+
+    # Ordered by _id so an interrupted export can resume with ?after=<last id>
+    cursor = collection.find(query, {field: 1 for field in fields}).sort("_id", 1).batch_size(batch_size)
+    async for document in cursor:
+        yield {"id": str(document["_id"]), **{field: document.get(field) for field in fields}}
+
+
+async def _ndjson(rows: AsyncIterator[dict], batch_size: int) -> AsyncIterator[bytes]:
+    lines = []
+    async for row in rows:
+        lines.append(dump_json(row))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def _csv(rows: AsyncIterator[dict], fields: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["id", *fields])
+    writer.writeheader()
+    count = 0
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def export_response(model, format: str, fields: Optional[str], active: Optional[bool], after: Optional[str], batch_size: int) -> StreamingResponse:
+    """
+    Stream a subscriber collection as NDJSON or CSV, one Motor batch at a time, so memory stays flat
+    however large the list is.
+    """
+    selected = parse_fields(fields)
+    if after:
+        try:
+            ObjectId(after)
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid resume id")
+
+    rows = _rows(collection_for(model), selected, active, after, batch_size)
+    body = _ndjson(rows, batch_size) if format == "ndjson" else _csv(rows, selected, batch_size)
+    filename = f"{model.Settings.collection}.{format}"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from classes.EmailTemplate import EmailTemplate
+from classes.MailFanout import FanoutResult, MailFanout, Recipient
+from classes.NewsLetterSignup import NewsletterSignup
+from classes.WaitlistSingup import WaitlistSignup
+from classes.Consistency import collection_for
+
+
+def unsubscribe_link(list_name: str, email: str) -> str:
+    return f"https://journey-api.thehightabl.com/{list_name}/unsubscribe?email={email}"
+
+
+def normalize_email(email: str) -> str:
+    # Stored lowercased, so an address matches however it is typed and however SendGrid reports it
+    return email.strip().lower()
+
+
+class SubscriberList():
+    """
+    Subscribe/unsubscribe operations shared by the newsletter and waitlist routers.
+    """
+
+    def __init__(self, model, list_name: str, welcome_template_variable: str, from_email: Optional[str] = None):
+        self.model = model
+        self.list_name = list_name
+        self.welcome_template_variable = welcome_template_variable
+        self.from_email = from_email
+        # Set once normalize_stored_emails has run in this instance; until then mixed-case records
+        # stored before normalization are matched case-insensitively
+        self.emails_normalized = False
+
+    @property
+    def welcome_template_id(self) -> Optional[str]:
+        return os.environ.get(self.welcome_template_variable)
+
+    def email_filter(self, emails: Iterable[str]) -> dict:
+        """
+        Condition on the email field matching any of `emails`, whatever case they are stored in.
+        """
+        normalized = sorted({normalize_email(email) for email in emails})
+        if self.emails_normalized:
+            return {"$in": normalized}
+        # Anchored patterns still walk the email index rather than the whole collection
+        return {"$in": [re.compile(f"^{re.escape(email)}$", re.IGNORECASE) for email in normalized]}
+
+    async def subscribe(self, name: str, location: str, email: str) -> bool:
+        """
+        Insert or reactivate a subscriber in one round trip. Returns False when the email was already active.
+        """
+        collection = collection_for(self.model)
+        if not self.emails_normalized:
+            # Reactivate a record stored with other casing instead of inserting a lowercase duplicate
+            previous = await collection.find_one_and_update({"email": self.email_filter([email])}, {"$set": {"isActive": True}}, projection={"isActive": 1}, return_document=ReturnDocument.BEFORE)
+            if previous is not None:
+                return not previous.get("isActive", True)
+
+        query = {"email": normalize_email(email)}
+        update = {"$set": {"isActive": True}, "$setOnInsert": {"name": name, "location": location}}
+        try:
+            previous = await collection.find_one_and_update(query, update, projection={"isActive": 1}, upsert=True, return_document=ReturnDocument.BEFORE)
+        except DuplicateKeyError:
+            # A concurrent signup inserted the same email first; the retry matches that document
+            previous = await collection.find_one_and_update(query, update, projection={"isActive": 1}, upsert=True, return_document=ReturnDocument.BEFORE)
+
+        return previous is None or not previous.get("isActive", True)
+
+    async def send_welcome(self, name: str, email: str) -> bool:
+        template = await EmailTemplate.get_cached(self.welcome_template_id)
+        if not template:
+            logging.error(f"Welcome email template {self.welcome_template_id} for {self.list_name} not found")
+            return False
+
+        subject, content = template.compiled().render({"name": name, "unsubscribe_link": unsubscribe_link(self.list_name, email)})
+        result = await MailFanout().send([Recipient(email=email)], subject, content, self.from_email, custom_args={"list": self.list_name})
+        return result.sent == 1
+
+    async def send_welcome_many(self, subscribers: List[dict]) -> Optional[FanoutResult]:
+        # One fan-out for a whole import: [name] and [unsubscribe_link] stay in place for SendGrid substitutions
+        template = await EmailTemplate.get_cached(self.welcome_template_id)
+        if not template:
+            logging.error(f"Welcome email template {self.welcome_template_id} for {self.list_name} not found")
+            return None
+
+        subject, content = template.compiled().source()
+        recipients = [
+            Recipient(email=subscriber["email"], substitutions={
+                "[name]": subscriber["name"],
+                "[unsubscribe_link]": unsubscribe_link(self.list_name, subscriber["email"]),
+            })
+            for subscriber in subscribers
+        ]
+        return await MailFanout().send(recipients, subject, content, self.from_email, custom_args={"list": self.list_name})
+
+    async def unsubscribe(self, email: str) -> bool:
+        result = await collection_for(self.model).update_many({"email": self.email_filter([email])}, {"$set": {"isActive": False}})
+        return result.matched_count > 0
+
+    async def normalize_stored_emails(self) -> dict:
+        """
+        Lowercase emails stored before addresses were normalized. A mixed-case record whose lowercase
+        address already exists is folded into it, and an unsubscribe on either one wins.
+        """
+        collection = collection_for(self.model)
+        normalized = merged = 0
+        async for document in collection.find({"email": {"$regex": "[A-Z]"}}, {"email": 1, "isActive": 1}):
+            email = normalize_email(document["email"])
+            try:
+                await collection.update_one({"_id": document["_id"]}, {"$set": {"email": email}})
+                normalized += 1
+            except DuplicateKeyError:
+                if not document.get("isActive", True):
+                    await collection.update_one({"email": email}, {"$set": {"isActive": False}})
+                await collection.delete_one({"_id": document["_id"]})
+                merged += 1
+        self.emails_normalized = True
+        return {"normalized": normalized, "merged": merged}
+
+
+newsletter_list = SubscriberList(NewsletterSignup, "newsletter", "NEWSLETTER_WELCOME_EMAIL_TEMPLATE_ID")
+waitlist_list = SubscriberList(WaitlistSignup, "waitlist", "WAITLIST_WELCOME_EMAIL_TEMPLATE_ID", from_email="no-reply@thehightabl.com")
+
+SUBSCRIBER_LISTS = {subscriber_list.list_name: subscriber_list for subscriber_list in (newsletter_list, waitlist_list)}
+
+
+async def normalize_all_stored_emails() -> Dict[str, dict]:
+    # Run at startup, so no list waits on an operator to match addresses exactly again
+    return {list_name: await subscriber_list.normalize_stored_emails() for list_name, subscriber_list in SUBSCRIBER_LISTS.items()}
@@ -0,0 +1,129 @@
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+# Placeholders the send paths know how to fill, written as [name] in template text
+RECIPIENT_PLACEHOLDERS = ("name", "unsubscribe_link")
+POST_PLACEHOLDERS = ("content", "link", "title", "summary")
+KNOWN_PLACEHOLDERS = RECIPIENT_PLACEHOLDERS + POST_PLACEHOLDERS
+
+TOKEN_PATTERN = re.compile(r"\[([a-z_][a-z0-9_]*)\]")
+MAX_COMPILED_TEMPLATES = 64
+
+
+def normalize_placeholder(placeholder: str) -> str:
+    # Templates may declare placeholders either as "name" or "[name]"
+    return placeholder.strip().strip("[]").strip()
+
+
+def token(placeholder: str) -> str:
+    return f"[{placeholder}]"
+
+
+class CompiledText:
+    """
+    Text split once into literal segments around its placeholder slots, so that
+    literals[0] + value(slots[0]) + literals[1] + ... + literals[-1] rebuilds it.
+    """
+    __slots__ = ("literals", "slots")
+
+    def __init__(self, literals: Tuple[str, ...], slots: Tuple[str, ...]):
+        self.literals = literals
+        self.slots = slots
+
+    @classmethod
+    def compile(cls, text: str, placeholders: Iterable[str]) -> "CompiledText":
+        names = sorted({normalize_placeholder(p) for p in placeholders}, key=len, reverse=True)
+        if not names:
+            return cls((text,), ())
+
+        pattern = re.compile("|".join(re.escape(token(name)) for name in names))
+        literals, slots, position = [], [], 0
+        for match in pattern.finditer(text):
+            literals.append(text[position:match.start()])
+            slots.append(match.group()[1:-1])
+            position = match.end()
+        literals.append(text[position:])
+        return cls(tuple(literals), tuple(slots))
+
+    def bind(self, values: Dict[str, str]) -> "CompiledText":
+        # Fold the bound slots into their neighbouring literals, leaving only the unbound ones
+        literals, slots, parts = [], [], [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            if slot in values:
+                parts.append(values[slot])
+                parts.append(literal)
+            else:
+                literals.append("".join(parts))
+                slots.append(slot)
+                parts = [literal]
+        literals.append("".join(parts))
+        return CompiledText(tuple(literals), tuple(slots))
+
+    def render(self, values: Dict[str, str]) -> str:
+        # Unfilled slots are written back as their [token]
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            parts.append(values.get(slot, token(slot)))
+            parts.append(literal)
+        return "".join(parts)
+
+    def source(self) -> str:
+        return self.render({})
+
+
+class CompiledTemplate:
+    __slots__ = ("subject", "body")
+
+    def __init__(self, subject: CompiledText, body: CompiledText):
+        self.subject = subject
+        self.body = body
+
+    @classmethod
+    def compile(cls, subject: str, body: str, subject_placeholders: List[str], body_placeholders: List[str]) -> "CompiledTemplate":
+        # Templates saved before placeholders were declared fall back to every known placeholder
+        return cls(
+            CompiledText.compile(subject, subject_placeholders or KNOWN_PLACEHOLDERS),
+            CompiledText.compile(body, body_placeholders or KNOWN_PLACEHOLDERS),
+        )
+
+    def bind(self, values: Dict[str, str]) -> "CompiledTemplate":
+        return CompiledTemplate(self.subject.bind(values), self.body.bind(values))
+
+    def render(self, values: Dict[str, str]) -> Tuple[str, str]:
+        return self.subject.render(values), self.body.render(values)
+
+    def source(self) -> Tuple[str, str]:
+        return self.subject.source(), self.body.source()
+
+
+_compiled: "OrderedDict[Tuple[str, int], CompiledTemplate]" = OrderedDict()
+
+
+def compile_template(template) -> CompiledTemplate:
+    """
+    Compile an EmailTemplate, reusing the cached result for the same template id and revision.
+    """
+    if template.id is None:
+        return CompiledTemplate.compile(template.subject, template.body, template.subject_placeholders, template.body_placeholders)
+
+    key = (str(template.id), template.revision)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = CompiledTemplate.compile(template.subject, template.body, template.subject_placeholders, template.body_placeholders)
+        _compiled[key] = compiled
+        if len(_compiled) > MAX_COMPILED_TEMPLATES:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(key)
+    return compiled
+
+
+def placeholder_errors(text: str, placeholders: List[str], field: str) -> List[str]:
+    declared = {normalize_placeholder(p) for p in placeholders}
+    used = {name for name in TOKEN_PATTERN.findall(text) if name in KNOWN_PLACEHOLDERS}
+
+    errors = [f"{field}: unknown placeholder {token(name)}" for name in sorted(declared - set(KNOWN_PLACEHOLDERS))]
+    errors += [f"{field}: placeholder {token(name)} is declared but missing from the text" for name in sorted(declared - used) if name in KNOWN_PLACEHOLDERS]
+    errors += [f"{field}: placeholder {token(name)} is used but not declared" for name in sorted(used - declared)]
+    return errors
@@ -1,44 +1,123 @@
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-from beanie import init_beanie
-import motor.motor_asyncio
 from contextlib import asynccontextmanager
-import asyncio
 
-from classes.BlogContent import BlogContent
-from classes.NewsLetterSignup import NewsletterSignup
-from classes.Post import Post
-from classes.EmailTemplate import EmailTemplate
-from classes.WaitlistSingup import WaitlistSignup
+from classes.Database import DOCUMENT_MODELS, database_ready, init_database
+from classes.MailFanout import MailFanout
+from classes.SendJobWorker import resume_jobs
+from classes.SubscriberList import normalize_all_stored_emails
+from classes.Background import spawn
+from classes.Indexes import start_index_reconciliation
+from classes.StaticAssets import static_assets
+from classes.Metrics import MetricsMiddleware
+from classes.AdmissionControl import AdmissionControl, ConcurrencyLimit, RateLimit
+from classes.Compression import CompressionMiddleware
+from classes.Consistency import ConsistencyPolicy, ConsistencyRouting, read_preference, write_concern
 
 from routes.BlogContent import router as blog_content_router
 from routes.Geolocation import router as geolocation_router
 from routes.Newsletter import router as newsletter_router
-from routes.Post import router as post_router
+from routes.Post import build_missing_renditions, router as post_router
 from routes.EmailTemplate import router as email_template_router
 from routes.Waitlist import router as waitlist_signup_router
+from routes.Jobs import router as jobs_router
+from routes.Admin import router as admin_router
+from routes.SendGridEvents import router as sendgrid_events_router
+from routes.Metrics import router as metrics_router
+from routes.Feeds import router as feeds_router
 import os
 
-# MongoDB connection string (update with your credentials if necessary)
-MONGO_URI = os.environ.get("MONGO_URI")
 API_KEY = "mysecretapikey123"
 
 
 # Connect to the database and initialize Beanie with the models
+async def start_services():
+    # Only the first start in this worker initializes Beanie and kicks off background maintenance
+    if await init_database():
+        start_index_reconciliation(
+            DOCUMENT_MODELS,
+            drop_extra=os.environ.get("MONGO_DROP_UNDECLARED_INDEXES") == "true",
+            rebuild_mismatched=os.environ.get("MONGO_REBUILD_MISMATCHED_INDEXES") == "true",
+        )
+        spawn(normalize_all_stored_emails(), name="normalize-emails")
+        spawn(build_missing_renditions(), name="build-renditions")
+
+        # Pick up send jobs abandoned by a recycled instance
+        await resume_jobs()
+
+# Guard for hosts that do not deliver lifespan events; a flag check once the worker is warm.
+# Only the routers that talk to Mongo depend on it.
+async def ensure_started():
+    if not database_ready():
+        await start_services()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
-    database = client.get_database(name="blog")
-
-    await init_beanie(database, document_models=[NewsletterSignup, Post, BlogContent, EmailTemplate, WaitlistSignup])
+    static_assets.load()
+    await start_services()
     yield
+    await MailFanout.close()
 
 # Run the database initialization on startup
 app = FastAPI(lifespan=lifespan)
 
 origins = ["https://journey.thehightabl.com", "http://localhost:3000"]
 
+# Where each class of request reads from and how its writes are acknowledged. Anonymous page reads may be
+# served by a secondary at most MONGO_MAX_STALENESS_SECONDS behind (90 is the driver's minimum); for that
+# long plus one heartbeat after this instance writes a collection, its reads go back to the primary.
+# Operator requests, recognised by the API key, always read from the primary.
+max_staleness = int(os.environ.get("MONGO_MAX_STALENESS_SECONDS", 90))
+public_reads = ConsistencyPolicy(
+    read_preference=read_preference(os.environ.get("MONGO_PUBLIC_READ_PREFERENCE", "secondaryPreferred"), max_staleness),
+    pin_after_write=max_staleness + 10,
+)
+# Unsubscribes and webhook deliveries are idempotent and cheap to repeat; the primary's acknowledgement is enough
+low_value_writes = ConsistencyPolicy(write_concern=write_concern(os.environ.get("MONGO_LOW_VALUE_WRITE_CONCERN", "1")))
+
+app.add_middleware(
+    ConsistencyRouting,
+    admin=ConsistencyPolicy(read_preference=read_preference("primary")),
+    routes={
+        "/posts": public_reads,
+        "/content": public_reads,
+        "/feed.xml": public_reads,
+        "/sitemap.xml": public_reads,
+        "/newsletter/unsubscribe": low_value_writes,
+        "/waitlist/unsubscribe": low_value_writes,
+        "/webhooks/sendgrid/": low_value_writes,
+    },
+)
+
+# Shed load per worker before it reaches the routers, so operator sends, exports and signup bursts
+# cannot starve the public reads. Inside CORS, so browsers can read the 429/503 replies.
+def signup_rate_limit():
+    return RateLimit(rate=float(os.environ.get("SIGNUP_RATE_PER_MINUTE", 5)) / 60, burst=int(os.environ.get("SIGNUP_BURST", 3)))
+
+app.add_middleware(
+    AdmissionControl,
+    concurrency={
+        "/newsletter/send-notification/": ConcurrencyLimit(limit=int(os.environ.get("SEND_NOTIFICATION_CONCURRENCY", 1)), queue=2),
+        "/waitlist/send-notification/": ConcurrencyLimit(limit=int(os.environ.get("SEND_NOTIFICATION_CONCURRENCY", 1)), queue=2),
+        "/newsletter/users": ConcurrencyLimit(limit=int(os.environ.get("EXPORT_CONCURRENCY", 2)), queue=2, retry_after=30),
+        "/waitlist/users": ConcurrencyLimit(limit=int(os.environ.get("EXPORT_CONCURRENCY", 2)), queue=2, retry_after=30),
+        "/admin/": ConcurrencyLimit(limit=2, queue=2),
+        "/posts/import": ConcurrencyLimit(limit=1, queue=1, timeout=1.0, retry_after=30),
+        "/newsletter/import": ConcurrencyLimit(limit=1, queue=1, timeout=1.0, retry_after=30),
+        "/waitlist/import": ConcurrencyLimit(limit=1, queue=1, timeout=1.0, retry_after=30),
+        "/newsletter/signup": ConcurrencyLimit(limit=int(os.environ.get("SIGNUP_CONCURRENCY", 16)), queue=32, timeout=2.0, retry_after=2),
+        "/waitlist/signup": ConcurrencyLimit(limit=int(os.environ.get("SIGNUP_CONCURRENCY", 16)), queue=32, timeout=2.0, retry_after=2),
+        "/posts/search": ConcurrencyLimit(limit=int(os.environ.get("SEARCH_CONCURRENCY", 16)), queue=64, timeout=2.0, retry_after=2),
+        "/geolocation/": ConcurrencyLimit(limit=int(os.environ.get("AUTOCOMPLETE_CONCURRENCY", 16)), queue=64, timeout=2.0, retry_after=2),
+    },
+    rate_limits={
+        "/newsletter/signup": signup_rate_limit(),
+        "/waitlist/signup": signup_rate_limit(),
+        "/geolocation/autocomplete": RateLimit(rate=float(os.environ.get("AUTOCOMPLETE_RATE_PER_SECOND", 5)), burst=int(os.environ.get("AUTOCOMPLETE_BURST", 20))),
+    },
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -46,21 +125,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# JSON and HTML not already precompressed; posts and static assets arrive with their Content-Encoding set
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024)))
+# Outermost, so latency includes CORS handling; sample read latency with METRICS_SAMPLE_RATE
+app.add_middleware(MetricsMiddleware)
 
 # API endpoint to sign up for the newsletter
-app.include_router(blog_content_router)
+app.include_router(blog_content_router, dependencies=[Depends(ensure_started)])
 app.include_router(geolocation_router)
-app.include_router(newsletter_router)
-app.include_router(post_router)
-app.include_router(email_template_router)
-app.include_router(waitlist_signup_router)
+app.include_router(newsletter_router, dependencies=[Depends(ensure_started)])
+app.include_router(post_router, dependencies=[Depends(ensure_started)])
+app.include_router(email_template_router, dependencies=[Depends(ensure_started)])
+app.include_router(waitlist_signup_router, dependencies=[Depends(ensure_started)])
+app.include_router(jobs_router, dependencies=[Depends(ensure_started)])
+app.include_router(admin_router, dependencies=[Depends(ensure_started)])
+app.include_router(sendgrid_events_router, dependencies=[Depends(ensure_started)])
+app.include_router(metrics_router)
+app.include_router(feeds_router, dependencies=[Depends(ensure_started)])
 
 
-@app.get("/")
-async def home():
-    with open("html_templates/home.html", "r") as file:
-        html_content = file.read()
-    return HTMLResponse(content=html_content)
+@app.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    return static_assets.response(request, "home.html")
 
 # To run the FastAPI app, use: uvicorn app_name:app --reload
 if __name__ == '__main__':
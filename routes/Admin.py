@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Query, Security
+from classes.APIKey import get_api_key
+from classes.Database import client_options, warm_up
+from classes.PoolTelemetry import pool_telemetry
+from classes.SubscriberList import normalize_all_stored_emails
+
+# Admin Endpoints
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Security(get_api_key)])
+
+# Pre-open Mongo connections and touch each collection, e.g. right before a newsletter blast
+@router.post("/warmup", response_model=dict)
+async def warmup(connections: int = Query(None, ge=1, le=500)):
+    result = await warm_up(connections)
+    return {**result, "pool": pool_telemetry.stats()}
+
+# Mongo connection pool settings and telemetry
+@router.get("/pool", response_model=dict)
+async def pool_stats():
+    return {"options": client_options(), **pool_telemetry.stats()}
+
+# Lowercase subscriber emails stored before signups normalized them; also runs at startup
+@router.post("/normalize-emails", response_model=dict)
+async def normalize_emails():
+    return await normalize_all_stored_emails()
@@ -1,9 +1,14 @@
-from typing import  List
+from typing import  Dict, List
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from pymongo import UpdateOne
 from classes.BlogContent import BlogContent
 from classes.APIKey import get_api_key
+from classes.HttpCache import conditional_response, dump_json, projection, wire_document
+from classes.ResponseCache import ResponseCache
+from classes.Consistency import collection_for
 from fastapi import Security
+import os
 
 # BlogContent Request Models
 class BlogContentRequest(BaseModel):
@@ -11,40 +16,98 @@ class BlogContentRequest(BaseModel):
     content: str
     section_name: str
 
+class BlogContentPageRequest(BaseModel):
+    # section_name -> content
+    sections: Dict[str, str]
+
+class BlogContentPageUpdateResponse(BaseModel):
+    matched: int
+    modified: int
+    upserted: int
+
+# Serialized content responses: the full listing, each page's section -> content map and single sections
+page_cache = ResponseCache(
+    max_bytes=int(os.environ.get("CONTENT_CACHE_MAX_BYTES", 4 * 1024 * 1024)),
+    ttl=float(os.environ.get("CONTENT_CACHE_TTL", 300)),
+)
+
+def invalidate_page(*page_names: str):
+    # Any write changes the listing as well as the page and its sections
+    page_cache.invalidate("content:list", *(f"content:page:{page_name}" for page_name in page_names))
+    for page_name in page_names:
+        page_cache.invalidate_prefix(f"content:section:{page_name}:")
+
 # BlogContent Endpoints
 router = APIRouter(prefix="/content", tags=["BlogContent"])
 @router.post("/", response_model=BlogContent)
 async def create_blog_content(content: BlogContentRequest, api_key = Security(get_api_key)):
     new_content = BlogContent(**content.model_dump())
     await new_content.insert()
+    invalidate_page(new_content.page_name)
     return new_content
 
 @router.get("/", response_model=List[BlogContent])
-async def list_blog_contents():
-    contents = await BlogContent.find_all().to_list()
-    return contents
+async def list_blog_contents(request: Request):
+    async def load():
+        contents = await collection_for(BlogContent).find({}, projection(BlogContent)).to_list(None)
+        return dump_json([wire_document(BlogContent, content) for content in contents])
+
+    cached = await page_cache.get_or_load("content:list", load)
+    return conditional_response(request, cached.body, cached.etag)
+
+@router.get("/{page_name}", response_model=Dict[str, str])
+async def get_blog_page(request: Request, page_name: str):
+    async def load():
+        sections = await collection_for(BlogContent).find({"page_name": page_name}, {"_id": 0, "section_name": 1, "content": 1}).to_list(None)
+        if not sections:
+            return None
+        return dump_json({section["section_name"]: section["content"] for section in sections})
+
+    cached = await page_cache.get_or_load(f"content:page:{page_name}", load)
+    if not cached:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return conditional_response(request, cached.body, cached.etag)
+
+@router.put("/{page_name}", response_model=BlogContentPageUpdateResponse)
+async def update_blog_page(page_name: str, page: BlogContentPageRequest, api_key = Security(get_api_key)):
+    if not page.sections:
+        raise HTTPException(status_code=400, detail="No sections given")
+
+    result = await collection_for(BlogContent).bulk_write([
+        UpdateOne({"page_name": page_name, "section_name": section_name}, {"$set": {"content": content}}, upsert=True)
+        for section_name, content in page.sections.items()
+    ], ordered=False)
+    invalidate_page(page_name)
+
+    return {"matched": result.matched_count, "modified": result.modified_count, "upserted": result.upserted_count}
 
 @router.get("/{page_name}/{section_name}", response_model=BlogContent)
-async def get_blog_content(page_name: str, section_name:str):
-    content = await BlogContent.find_one(BlogContent.page_name==page_name, BlogContent.section_name==section_name)
-    if not content:
+async def get_blog_content(request: Request, page_name: str, section_name:str):
+    async def load():
+        content = await collection_for(BlogContent).find_one({"page_name": page_name, "section_name": section_name}, projection(BlogContent))
+        return dump_json(wire_document(BlogContent, content)) if content else None
+
+    cached = await page_cache.get_or_load(f"content:section:{page_name}:{section_name}", load)
+    if not cached:
         raise HTTPException(status_code=404, detail="Content not found")
-    return content
+    return conditional_response(request, cached.body, cached.etag)
 
 @router.put("/{page_name}/{section_name}", response_model=BlogContent)
 async def update_blog_content(page_name: str, section_name:str, content: BlogContentRequest, api_key = Security(get_api_key)):
-    existing_content = await BlogContent.get(page_name=page_name, section_name=section_name)
+    existing_content = await BlogContent.find_one(BlogContent.page_name==page_name, BlogContent.section_name==section_name)
     if not existing_content:
         raise HTTPException(status_code=404, detail="Content not found")
-    
+
     await existing_content.update({"$set": content.model_dump()})
+    invalidate_page(page_name, content.page_name)
     return existing_content
 
 @router.delete("/{page_name}/{section_name}", response_model=dict)
 async def delete_blog_content(page_name: str, section_name:str, api_key = Security(get_api_key)):
-    content = await BlogContent.get(page_name=page_name, section_name=section_name)
+    content = await BlogContent.find_one(BlogContent.page_name==page_name, BlogContent.section_name==section_name)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
-    
+
     await content.delete()
+    invalidate_page(page_name)
     return {"message": "Content deleted successfully"}
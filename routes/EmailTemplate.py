@@ -1,8 +1,11 @@
 from pydantic import BaseModel, EmailStr
 from typing import List
 from classes.EmailTemplate import EmailTemplate
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from bson import ObjectId
+from classes.HttpCache import dump_json, projection, wire_document
 from classes.APIKey import get_api_key
+from classes.Consistency import collection_for
 from fastapi import Security
 
 
@@ -28,22 +31,32 @@ router = APIRouter(prefix="/email-templates", tags=["Email Templates"], dependen
 @router.post("/", response_model=EmailTemplate)
 async def create_email_template(email_template: EmailTemplateCreate):
     email_template_doc = EmailTemplate(**email_template.model_dump())
+
+    errors = email_template_doc.validate_placeholders()
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
     await email_template_doc.insert()
     return email_template_doc
 
 # Get All Email Templates
 @router.get("/", response_model=List[EmailTemplate])
 async def get_all_email_templates():
-    email_templates = await EmailTemplate.find_all().to_list()
-    return email_templates
+    email_templates = await collection_for(EmailTemplate).find({}, projection(EmailTemplate)).to_list(None)
+    return Response(dump_json([wire_document(EmailTemplate, template) for template in email_templates]), media_type="application/json")
+
+# Email Template Cache Statistics
+@router.get("/cache/stats", response_model=dict)
+async def get_email_template_cache_stats():
+    return EmailTemplate.cache_stats()
 
 # Get Single Email Template by ID
 @router.get("/{id}", response_model=EmailTemplate)
 async def get_email_template(id: str):
-    email_template = await EmailTemplate.get(id)
+    email_template = await collection_for(EmailTemplate).find_one({"_id": ObjectId(id)}, projection(EmailTemplate)) if ObjectId.is_valid(id) else None
     if not email_template:
         raise HTTPException(status_code=404, detail="EmailTemplate not found")
-    return email_template
+    return Response(dump_json(wire_document(EmailTemplate, email_template)), media_type="application/json")
 
 # Update Email Template by ID
 @router.put("/{id}", response_model=EmailTemplate)
@@ -57,7 +70,13 @@ async def update_email_template(id: str, email_template_update: EmailTemplateUpd
     for key, value in update_data.items():
         setattr(email_template, key, value)
 
+    errors = email_template.validate_placeholders()
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    email_template.revision += 1
     await email_template.save()
+    EmailTemplate.invalidate(id)
     return email_template
 
 # Delete Email Template by ID
@@ -68,4 +87,5 @@ async def delete_email_template(id: str):
         raise HTTPException(status_code=404, detail="EmailTemplate not found")
 
     await email_template.delete()
+    EmailTemplate.invalidate(id)
     return email_template
\ No newline at end of file
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Request, Response
+from classes.Feeds import post_feeds
+from classes.HttpCache import conditional_response
+
+# Feed Endpoints
+
+router = APIRouter(tags=["Feeds"])
+
+# RSS 2.0 feed of the latest posts, for feed readers
+@router.get("/feed.xml", response_class=Response)
+async def get_feed(request: Request):
+    body, etag = await post_feeds.feed()
+    return conditional_response(request, body, etag, media_type="application/rss+xml; charset=utf-8")
+
+# Every post URL, for crawlers
+@router.get("/sitemap.xml", response_class=Response)
+async def get_sitemap(request: Request):
+    body, etag = await post_feeds.sitemap()
+    return conditional_response(request, body, etag, media_type="application/xml; charset=utf-8")
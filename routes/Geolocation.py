@@ -1,12 +1,12 @@
 from fastapi import APIRouter, HTTPException
-from classes.GoogleMaps import Maps
+from classes.Autocomplete import get_autocomplete_service
 
 router = APIRouter(prefix="/geolocation", tags=["Geolocation"])
 # Geolocation Autocomplete
 @router.get("/autocomplete")
 async def geolocation_autocomplete(input: str):
-    # Call Google Maps Places API for autocomplete
+    # Call Google Maps Places API for autocomplete, through the prefix cache
     try:
-        return Maps().autocomplete(input)
+        return await get_autocomplete_service().autocomplete(input)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
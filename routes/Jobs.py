@@ -0,0 +1,53 @@
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Security
+from classes.APIKey import get_api_key
+from classes.SendJob import SendJob
+from classes.SendJobWorker import ACTIVE_STATUSES, start_worker
+
+
+# Send Job Response Model
+class SendJobProgress(BaseModel):
+    id: str
+    list_name: str
+    post_id: str
+    status: str
+    total: int
+    processed: int
+    sent: int
+    failed: int
+    unknown: int
+    skipped: int
+    percent_complete: float
+    throughput_per_second: Optional[float]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+# Send Job Endpoints
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"], dependencies=[Security(get_api_key)])
+
+@router.get("/{id}", response_model=SendJobProgress)
+async def get_job(id: str):
+    job = await SendJob.get(id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Polling an abandoned job picks it back up on this instance
+    if job.status in ACTIVE_STATUSES and (job.lease_until is None or job.lease_until < datetime.utcnow()):
+        start_worker(job.id)
+
+    throughput = None
+    if job.started_at and job.updated_at and job.updated_at > job.started_at:
+        throughput = round(job.processed / (job.updated_at - job.started_at).total_seconds(), 2)
+
+    return SendJobProgress(
+        **job.model_dump(exclude={"id"}),
+        id=str(job.id),
+        percent_complete=round(100 * job.processed / job.total, 2) if job.total else (100.0 if job.status == "completed" else 0.0),
+        throughput_per_second=throughput,
+    )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Response, Security
+from classes.APIKey import get_api_key
+from classes.EmailTemplate import EmailTemplate
+from classes.Metrics import metrics
+from classes.PoolTelemetry import pool_telemetry
+from routes.BlogContent import page_cache
+from routes.Post import post_cache
+
+# Metrics Endpoints
+
+router = APIRouter(tags=["Metrics"])
+
+def collect_pool_gauges():
+    for address, pool in pool_telemetry.stats()["pools"].items():
+        yield "mongo_pool_connections_open", "Open connections per Mongo server", {"server": address}, pool["open"]
+        yield "mongo_pool_connections_in_use", "Checked-out connections per Mongo server", {"server": address}, pool["in_use"]
+
+def collect_cache_gauges():
+    for name, cache in (("posts", post_cache), ("content", page_cache)):
+        stats = cache.stats()
+        yield "response_cache_bytes", "Bytes held by each response cache", {"cache": name}, stats["bytes"]
+        yield "response_cache_hits", "Response cache hits since start", {"cache": name}, stats["hits"]
+        yield "response_cache_misses", "Response cache misses since start", {"cache": name}, stats["misses"]
+    stats = EmailTemplate.cache_stats()
+    yield "template_cache_hits", "Email template cache hits since start", {}, stats["hits"]
+    yield "template_cache_misses", "Email template cache misses since start", {}, stats["misses"]
+
+metrics.collector(collect_pool_gauges)
+metrics.collector(collect_cache_gauges)
+
+# Prometheus scrape endpoint
+@router.get("/metrics", response_class=Response)
+async def get_metrics(api_key = Security(get_api_key)):
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,11 +1,25 @@
-from typing import Optional, List, Dict
+from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from bson import ObjectId
 from classes.Post import Post
 from classes.APIKey import get_api_key
+from classes.TTLCache import TTLCache
+from classes.HttpCache import conditional_response, dump_json, projection, wire_document
+from classes.ResponseCache import ResponseCache
+from classes.Compression import ENCODINGS, compress, preferred_encoding
+from classes.PostRendition import delete_rendition, load_variant, rendered_post_ids, save_rendition
+from classes.Feeds import post_feeds
+from classes.BulkImport import ImportReport, insert_documents, read_rows
+from classes.Search import leading_text, normalize_query, search_terms, snippet
+from classes.Consistency import collection_for
 from fastapi import Security
 from math import ceil
+import asyncio
+import base64
+import json
+import os
 
 
 # Post Request Models
@@ -20,6 +34,11 @@ class PostRequest(BaseModel):
     mail_subject: str
     mail_content: str
 
+# One row of a bulk import: a full post, including the fields normally derived at publish time
+class PostImport(PostRequest):
+    img_url: str
+    text_url: str
+
 class PostResponse(BaseModel):
     title: str
     summary: str
@@ -40,11 +59,100 @@ class SinglePostResponse(BaseModel):
 
 class PaginatedPostResponse(BaseModel):
     posts: List[PostResponse]
+    total_posts: Optional[int] = None
+    total_pages: Optional[int] = None
+    current_page: Optional[int] = None
+    limit: int
+    next_cursor: Optional[str] = None
+
+class PostSearchResult(PostResponse):
+    # HTML-escaped excerpt with the matched words wrapped in <mark>
+    snippet: str
+    score: float
+
+class PostSearchResponse(BaseModel):
+    posts: List[PostSearchResult]
     total_posts: int
     total_pages: int
     current_page: int
     limit: int
 
+# Total post count shared by listing requests, refreshed at most every POSTS_COUNT_TTL seconds
+_post_count = TTLCache(maxsize=1, ttl=float(os.environ.get("POSTS_COUNT_TTL", 60)))
+
+async def count_posts() -> int:
+    total_posts = _post_count.get("total")
+    if total_posts is None:
+        total_posts = await Post.count()
+        _post_count.set("total", total_posts)
+    return total_posts
+
+# Serialized responses for the hot read routes, keyed by post id or text_url plus encoding, and page/cursor
+post_cache = ResponseCache(
+    max_bytes=int(os.environ.get("POST_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.environ.get("POST_CACHE_TTL", 300)),
+)
+
+def invalidate_post_cache(post: Post):
+    post_cache.invalidate(*(key for encoding in ("identity", *ENCODINGS) for key in (f"post:id:{post.id}:{encoding}", f"post:url:{post.text_url}:{encoding}")))
+    post_cache.invalidate_prefix("posts:list:")
+    post_cache.invalidate_prefix("posts:search:")
+
+def encode_cursor(post: dict) -> str:
+    raw = json.dumps({"d": post["publish_date"].isoformat(), "i": str(post["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        publish_date, post_id = datetime.fromisoformat(raw["d"]), ObjectId(raw["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Everything strictly after the cursor in (publish_date desc, _id desc) order
+    return {"$or": [
+        {"publish_date": {"$lt": publish_date}},
+        {"publish_date": publish_date, "_id": {"$lt": post_id}},
+    ]}
+
+def render_post(post: dict) -> bytes:
+    fields = [key for key, included in projection(SinglePostResponse).items() if included]
+    return dump_json(wire_document(SinglePostResponse, {key: post[key] for key in fields if key in post}))
+
+async def store_rendition(post: dict):
+    await save_rendition(post["_id"], post["text_url"], render_post(post))
+
+# Levels for a post served before its rendition exists, as CompressionMiddleware would use
+FALLBACK_LEVELS = {"gzip": 6, "br": 5}
+
+async def post_variant(query: dict, rendition_query: dict, encoding: str) -> Optional[bytes]:
+    body = await load_variant(rendition_query, encoding)
+    if body is None:
+        # Posts inserted outside the API, or stored by an instance without brotli: rendered for this
+        # response only, reads never write; build_missing_renditions stores them
+        post = await collection_for(Post).find_one(query, projection(SinglePostResponse))
+        if not post:
+            return None
+        body = compress(render_post(post), encoding, FALLBACK_LEVELS.get(encoding))
+    return body
+
+async def build_missing_renditions() -> int:
+    """
+    Store renditions for posts that have none, e.g. ones inserted straight into the collection. Run at startup.
+    """
+    rendered = await rendered_post_ids()
+    built = 0
+    async for post in Post.get_motor_collection().find({"_id": {"$nin": list(rendered)}}, projection(SinglePostResponse, "_id", "text_url")):
+        await store_rendition(post)
+        built += 1
+    return built
+
+def post_response(request: Request, cached, encoding: str):
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return conditional_response(request, cached.body, cached.etag, headers=headers)
+
 # Post Endpoints
 
 router = APIRouter(prefix="/posts", tags=["Post"])
@@ -53,51 +161,141 @@ router = APIRouter(prefix="/posts", tags=["Post"])
 async def create_post(post: PostRequest, api_key:str = Security(get_api_key)):
     new_post = Post(**post.model_dump())
     await new_post.insert()
+    await store_rendition({**new_post.model_dump(), "_id": new_post.id})
+    post_feeds.upsert({**new_post.model_dump(), "_id": new_post.id})
+    _post_count.clear()
+    invalidate_post_cache(new_post)
     return new_post
 
+@router.post("/import", response_model=dict)
+async def import_posts(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), api_key:str = Security(get_api_key)):
+    """
+    Bulk insert posts from a streamed NDJSON or CSV body, one post per row.
+    Rows whose text_url already exists are reported and skipped; the rest are inserted.
+    """
+    report = ImportReport()
+    inserted = await insert_documents(collection_for(Post), PostImport, read_rows(request.stream(), format), "text_url", report)
+
+    if inserted:
+        for post in inserted:
+            await store_rendition(post)
+            post_feeds.upsert(post)
+        _post_count.clear()
+        post_cache.clear()
+    return report.as_dict()
+
 @router.get("/", response_model=PaginatedPostResponse)
-async def list_posts(page: int = Query(1, ge=1), limit: int = Query(10, ge=1)):
+async def list_posts(request: Request, page: int = Query(1, ge=1), limit: int = Query(10, ge=1), cursor: Optional[str] = None, include_total: bool = False):
     """
     List posts with pagination and return additional metadata.
 
-    :param page: The page number (default: 1).
+    :param page: The page number (default: 1). Ignored when a cursor is given.
     :param limit: The number of posts per page (default: 10).
+    :param cursor: Opaque `next_cursor` from a previous response; pages by (publish_date, _id) without skipping.
+    :param include_total: Also return total_posts/total_pages in cursor mode.
     :return: A dictionary with paginated posts, total posts, and total pages.
     """
-    # Calculate the number of items to skip based on the page number
-    skip = (page - 1) * limit
+    query_filter = decode_cursor(cursor) if cursor else {}
+
+    async def load() -> bytes:
+        # The PostResponse fields plus the _id needed for cursors, encoded as read
+        query = collection_for(Post).find(query_filter, projection(PostResponse, "_id")).sort([("publish_date", -1), ("_id", -1)])
+        if not cursor:
+            # Calculate the number of items to skip based on the page number
+            query = query.skip((page - 1) * limit)
+
+        # Fetch one extra projected post to learn whether another page follows
+        posts = await query.limit(limit + 1).to_list(limit + 1)
+        has_more = len(posts) > limit
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]) if has_more else None
+        for post in posts:
+            del post["_id"]
+
+        response = {
+            "posts": [wire_document(PostResponse, post) for post in posts],
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
+
+        # Page mode keeps returning the totals; cursor mode only when asked for
+        if not cursor or include_total:
+            total_posts = await count_posts()
+            response["total_posts"] = total_posts
+            response["total_pages"] = ceil(total_posts / limit)
+        if not cursor:
+            response["current_page"] = page
+
+        return dump_json(wire_document(PaginatedPostResponse, response))
+
+    key = f"posts:list:{cursor}:{include_total}:{limit}" if cursor else f"posts:list:page:{page}:{limit}"
+    cached = await post_cache.get_or_load(key, load)
+    return conditional_response(request, cached.body, cached.etag)
+
+@router.get("/search", response_model=PostSearchResponse)
+async def search_posts(request: Request, q: str = Query(..., min_length=1, max_length=200), page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=50)):
+    """
+    Full-text search over title, subtitle, summary and body, best matches first.
+
+    :param q: Words to look for; supports "quoted phrases" and -excluded words.
+    :param page: The page number (default: 1).
+    :param limit: The number of posts per page (default: 10, at most 50).
+    """
+    query = normalize_query(q)
+    terms = search_terms(query)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query has no words to match")
 
-    # Get the total number of posts in the collection
-    total_posts = await Post.count()
+    async def load() -> bytes:
+        collection = collection_for(Post)
+        text_filter = {"$text": {"$search": query}}
+        fields = {**projection(PostResponse, "body"), "score": {"$meta": "textScore"}}
+        cursor = collection.find(text_filter, fields).sort([("score", {"$meta": "textScore"}), ("publish_date", -1)]).skip((page - 1) * limit).limit(limit)
+        posts, total_posts = await asyncio.gather(cursor.to_list(limit), collection.count_documents(text_filter))
 
-    # Fetch the paginated posts
-    posts = await Post.find_all().sort("-publish_date").skip(skip).limit(limit).to_list()
+        results = []
+        for post in posts:
+            # Bodies are HTML; fall back to the summary when only the title or subtitle matched
+            excerpt = snippet(post.pop("body"), terms) or snippet(post["summary"], terms) or leading_text(post["summary"])
+            results.append(wire_document(PostResponse, {**post, "snippet": excerpt}))
 
-    # Calculate the total number of pages
-    total_pages = ceil(total_posts / limit)
+        return dump_json({
+            "posts": results,
+            "total_posts": total_posts,
+            "total_pages": ceil(total_posts / limit),
+            "current_page": page,
+            "limit": limit,
+        })
 
-    # Return the paginated posts along with metadata
-    return {
-        "posts": [item.model_dump() for item in posts],
-        "total_posts": total_posts,
-        "total_pages": total_pages,
-        "current_page": page,
-        "limit": limit
-    }
+    cached = await post_cache.get_or_load(f"posts:search:{query}:{page}:{limit}", load)
+    return conditional_response(request, cached.body, cached.etag)
 
 @router.get("/{post_id}", response_model=SinglePostResponse)
-async def get_post(post_id: str):
-    post = await Post.get(post_id)
-    if not post:
+async def get_post(request: Request, post_id: str):
+    # Served from the bytes compressed when the post was written
+    encoding = preferred_encoding(request.headers.get("accept-encoding"))
+
+    async def load() -> Optional[bytes]:
+        if not ObjectId.is_valid(post_id):
+            return None
+        return await post_variant({"_id": ObjectId(post_id)}, {"post_id": ObjectId(post_id)}, encoding)
+
+    cached = await post_cache.get_or_load(f"post:id:{post_id}:{encoding}", load)
+    if not cached:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post
+    return post_response(request, cached, encoding)
     
 @router.get("/article/{text_url}", response_model=SinglePostResponse)
-async def get_post_by_text_url(text_url: str):
-    post = await Post.find_one(Post.text_url == text_url)
-    if not post:
+async def get_post_by_text_url(request: Request, text_url: str):
+    encoding = preferred_encoding(request.headers.get("accept-encoding"))
+
+    async def load() -> Optional[bytes]:
+        return await post_variant({"text_url": text_url}, {"text_url": text_url}, encoding)
+
+    cached = await post_cache.get_or_load(f"post:url:{text_url}:{encoding}", load)
+    if not cached:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post
+    return post_response(request, cached, encoding)
 
 
 @router.put("/{post_id}", response_model=Post)
@@ -107,6 +305,10 @@ async def update_post(post_id: str, post: PostRequest, api_key:str = Security(ge
         raise HTTPException(status_code=404, detail="Post not found")
     
     await existing_post.update({"$set": post.model_dump()})
+    updated = {**existing_post.model_dump(), **post.model_dump(), "_id": existing_post.id}
+    await store_rendition(updated)
+    post_feeds.upsert(updated)
+    invalidate_post_cache(existing_post)
     return existing_post
 
 @router.delete("/{post_id}", response_model=dict)
@@ -116,4 +318,8 @@ async def delete_post(post_id: str, api_key:str = Security(get_api_key)):
         raise HTTPException(status_code=404, detail="Post not found")
     
     await post.delete()
+    await delete_rendition(post.id)
+    post_feeds.remove(post.id)
+    _post_count.clear()
+    invalidate_post_cache(post)
     return {"message": "Post deleted successfully"}
@@ -0,0 +1,18 @@
+import hmac
+import os
+from typing import List
+from fastapi import APIRouter, Body, HTTPException
+from classes.SendGridEvents import ingest_events
+
+# SendGrid Event Webhook Endpoints
+
+router = APIRouter(prefix="/webhooks/sendgrid", tags=["Webhooks"])
+
+# Configure the webhook URL in SendGrid as /webhooks/sendgrid/events?token=<SENDGRID_WEBHOOK_TOKEN>
+@router.post("/events", response_model=dict)
+async def receive_sendgrid_events(token: str, events: List[dict] = Body(...)):
+    expected = os.environ.get("SENDGRID_WEBHOOK_TOKEN")
+    if not expected or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+    return await ingest_events(events)
@@ -1,13 +1,20 @@
-from typing import List
+from typing import List, Optional
 from pydantic import EmailStr, BaseModel
-from fastapi import Security, APIRouter, HTTPException
+from fastapi import Request, Response, Security, APIRouter, HTTPException, Query
 from fastapi.responses import HTMLResponse
 import logging
 from classes.APIKey import get_api_key
 from classes.Post import Post
 from classes.EmailTemplate import EmailTemplate
-from classes.SendGrid import SendGrid
+from classes.SendJobWorker import enqueue_send_job
+from classes.StaticAssets import static_assets
+from classes.HttpCache import dump_json, projection, wire_document
+from classes.SubscriberExport import export_response
+from classes.BulkImport import import_subscribers
+from classes.SubscriberList import waitlist_list
+from classes.Background import spawn
 from classes.WaitlistSingup import WaitlistSignup
+from classes.Consistency import collection_for
 
 import os
 
@@ -23,38 +30,46 @@ router = APIRouter(prefix="/waitlist", tags=["Waitlist"])
 
 @router.post("/signup", response_model=bool, status_code=201)
 async def signup_for_waitlist(waitlist: WaitlistSignupRequest):
+    if not waitlist_list.welcome_template_id:
+        raise HTTPException(status_code=500, detail="Missing email template ID in environment variables")
+
     try:
-        welcome_mail_template_id = os.environ.get("WAITLIST_WELCOME_EMAIL_TEMPLATE_ID")
-        if not welcome_mail_template_id:
-            raise HTTPException(status_code=500, detail="Missing email template ID in environment variables")
-        
-        email_template = await EmailTemplate.get(welcome_mail_template_id)
-        
-        existing_user = await WaitlistSignup.find_one(WaitlistSignup.email == waitlist.email)
-        if existing_user:
-            if existing_user.isActive:
-                raise HTTPException(status_code=400, detail="Email already signed up for the waitlist")
-            else:
-                existing_user.isActive = True
-                await existing_user.save()
-        else:
-            new_signup = WaitlistSignup(**waitlist.model_dump())
-            await new_signup.insert()
-
-        send_grid = SendGrid()
-        send_grid.send_email(to_email=waitlist.email, subject=email_template.subject, content=email_template.body.replace("[name]", waitlist.name), from_email="no-reply@thehightabl.com")
-
-        return True
+        subscribed = await waitlist_list.subscribe(waitlist.name, waitlist.location, waitlist.email)
     except Exception as e:
         logging.error(f"Error occurred while executing signup_for_waitlist: {e}")
         raise HTTPException(status_code=500, detail=f"Error occurred while executing signup_for_waitlist: {e}")
 
-@router.get("/users", response_model=List[WaitlistSignup])
-async def get_waitlist_users(api_key = Security(get_api_key)):
-    users = await WaitlistSignup.find_all().to_list()
-    return users
+    if not subscribed:
+        raise HTTPException(status_code=400, detail="Email already signed up for the waitlist")
+
+    # The welcome mail goes out after the reply, so SendGrid latency never reaches the signup form
+    spawn(waitlist_list.send_welcome(waitlist.name, waitlist.email), name="welcome-waitlist")
+    return True
 
-@router.get("/send-notification/{post_id}")
+# Bulk add subscribers from a streamed NDJSON or CSV body (name, location, email per row)
+@router.post("/import", response_model=dict)
+async def import_waitlist_users(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), welcome: bool = False, api_key = Security(get_api_key)):
+    if welcome and not waitlist_list.welcome_template_id:
+        raise HTTPException(status_code=500, detail="Missing email template ID in environment variables")
+    return await import_subscribers(waitlist_list, WaitlistSignupRequest, request.stream(), format, welcome)
+
+@router.get("/users", response_model=List[WaitlistSignup])
+async def get_waitlist_users(
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = None,
+    active: Optional[bool] = None,
+    after: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    api_key = Security(get_api_key),
+):
+    # ?format=ndjson|csv streams the list instead of building one JSON array
+    if format:
+        return export_response(WaitlistSignup, format, fields, active, after, batch_size)
+
+    users = await collection_for(WaitlistSignup).find({}, projection(WaitlistSignup)).to_list(None)
+    return Response(dump_json([wire_document(WaitlistSignup, user) for user in users]), media_type="application/json")
+
+@router.get("/send-notification/{post_id}", status_code=202)
 async def send_waitlist_notification(post_id: str, api_key = Security(get_api_key)):
     try:
         post = await Post.get(post_id)
@@ -67,46 +82,29 @@ async def send_waitlist_notification(post_id: str, api_key = Security(get_api_ke
         if not email_template_id:
             raise HTTPException(status_code=500, detail="Missing email template ID in environment variables")
 
-        email_template = await EmailTemplate.get(email_template_id)
+        email_template = await EmailTemplate.get_cached(email_template_id)
 
         if not email_template:
             raise HTTPException(status_code=400, detail="Email Template not found")
         
-        waitlist = await WaitlistSignup.find(WaitlistSignup.isActive == True).to_list()
-
-        if not waitlist:
+        if not await WaitlistSignup.find_one(WaitlistSignup.isActive == True):
             raise HTTPException(status_code=400, detail="No active signups found in waitlist")
-        
-
-        original_subject = post.mail_subject or email_template.subject
-        original_content = email_template.body.replace("[content]", post.mail_content)
-        original_content = original_content.replace("[link]", f"https://journey.thehightabl.com/posts/article/{post_id}").replace("[title]", post.title).replace("[summary]", post.summary)
-        original_subject = original_subject.replace("[title]", post.title)
-
-        send_grid = SendGrid()
 
-        for user in waitlist:
-            subject = original_subject.replace("[name]", user.name)
-            content = original_content.replace("[name]", user.name).replace("[unsubscribe_link]", f"https://journey-api.thehightabl.com/waitlist/unsubscribe?email={user.email}")
+        job = await enqueue_send_job("waitlist", post_id, email_template_id, 'no-reply@thehightabl.com')
 
-            send_grid.send_email(user.email, subject, content, 'no-reply@thehightabl.com')
-        
-        return {"status": "success", "emails_sent": len(waitlist)}
+        return {"status": job.status, "job_id": str(job.id)}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error occurred: {str(e)}")
     
 
 @router.get("/unsubscribe", response_class=HTMLResponse)
-async def get_html(email: EmailStr):
+async def get_html(request: Request, email: EmailStr):
     try:
-        user = await WaitlistSignup.find_one(WaitlistSignup.email == email)
-        user.isActive = False
-        await user.save()
-        
-        with open("html_templates/unsubscribe.html", "r") as file:
-            html_content = file.read()
-        return HTMLResponse(content=html_content)
+        await waitlist_list.unsubscribe(email)
+
+        # The page confirms a side effect, so it must never be served from a shared cache
+        return static_assets.response(request, "unsubscribe.html", cache_control="no-store")
     except Exception as e:
         print(e)
         return HTTPException(status_code=500, detail={"message": f"Error occurred: {str(e)}"})
@@ -0,0 +1,51 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import motor.motor_asyncio
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classes.Consistency import ConsistencyPolicy, collection_for, current_policy, recent_writes  # noqa: E402
+from classes.Metrics import metrics  # noqa: E402
+
+# Never connects: building collections and deriving options needs no server
+client = motor.motor_asyncio.AsyncIOMotorClient("mongodb://localhost:27017", connect=False)
+
+
+class Model():
+    @staticmethod
+    def get_motor_collection():
+        return client["blog"]["Post"]
+
+
+def write(collection: str, request_id: int):
+    recent_writes.started(SimpleNamespace(command_name="update", command={"update": collection}, request_id=request_id))
+    recent_writes.succeeded(SimpleNamespace(request_id=request_id))
+
+
+def pinned_count() -> float:
+    return metrics._counters["mongo_primary_pinned_total"].get((("collection", "Post"),), 0.0)
+
+
+def test_reads_use_the_policy_preference_without_a_recent_write():
+    recent_writes.clear()
+    token = current_policy.set(ConsistencyPolicy(read_preference=SecondaryPreferred(), pin_after_write=100))
+    try:
+        assert collection_for(Model).read_preference == SecondaryPreferred()
+    finally:
+        current_policy.reset(token)
+
+
+def test_reads_after_a_write_are_pinned_to_the_primary():
+    recent_writes.clear()
+    write("Post", 1)
+    before = pinned_count()
+    token = current_policy.set(ConsistencyPolicy(read_preference=SecondaryPreferred(), pin_after_write=100))
+    try:
+        assert collection_for(Model).read_preference == Primary()
+    finally:
+        current_policy.reset(token)
+        recent_writes.clear()
+    assert pinned_count() == before + 1